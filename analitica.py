@@ -0,0 +1,130 @@
+# analitica.py
+import math
+from datetime import timedelta
+from itertools import accumulate
+
+from sqlalchemy import Date, Float, cast, func, literal
+
+
+# ─────────────────────────────────────────────
+#  OCUPACIÓN PONDERADA EN EL TIEMPO
+#  - Cada estadía es un intervalo [entrada, salida) en minutos
+#  - Minutos‑vehículo por hora con arreglos de diferencias
+#    (O(estadías + horas), sin recorrer hora por hora cada estadía)
+#  - Pico de concurrencia con un barrido de eventos ordenados
+# ─────────────────────────────────────────────
+DIAS_SEMANA = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+
+
+def minutos_desde(columna, base, dialecto):
+    """Expresión SQL: minutos (float) entre ``base`` y ``columna``.
+
+    Se calcula en la BD para no convertir un datetime por fila en Python.
+    """
+    if dialecto == "sqlite":
+        return (func.julianday(columna) - func.julianday(literal(base))) * 1440.0
+    return cast(func.extract("epoch", columna - literal(base)), Float) / 60.0
+
+
+def dia_de(columna, dialecto):
+    """Expresión SQL: fecha (sin hora) de ``columna``; en SQLite como texto ISO."""
+    if dialecto == "sqlite":
+        return func.date(columna)
+    return cast(columna, Date)
+
+
+def ocupacion(intervalos, desde, hasta, plazas_por_fila, detalle=False):
+    """Ocupación entre ``desde`` y ``hasta``.
+
+    intervalos: iterable de (minuto_entrada, minuto_salida, fila) medidos
+    desde ``desde`` (que debe venir truncado a la hora).
+    plazas_por_fila: {fila: cantidad de plazas}.
+    """
+    total_min = (hasta - desde).total_seconds() / 60
+    horas = max(1, math.ceil(total_min / 60))
+    parcial = [0.0] * (horas + 1)    # minutos sueltos al inicio/fin de cada estadía
+    completas = [0] * (horas + 1)    # diferencias: estadías que cubren la hora entera
+    eventos = []
+    minutos_fila = {}
+
+    for entrada, salida, fila in intervalos:
+        a = entrada if entrada > 0 else 0.0
+        b = salida if salida < total_min else total_min
+        if b <= a:
+            continue
+        ha, hb = int(a // 60), int(b // 60)
+        if ha == hb:
+            parcial[ha] += b - a
+        else:
+            parcial[ha] += (ha + 1) * 60 - a
+            parcial[hb] += b - hb * 60
+            completas[ha + 1] += 1
+            completas[hb] -= 1
+        eventos.append((a, 1))
+        eventos.append((b, -1))
+        minutos_fila[fila] = minutos_fila.get(fila, 0.0) + (b - a)
+
+    minutos_hora = [60 * c + p for c, p in zip(accumulate(completas), parcial)][:horas]
+    # La última hora puede quedar cortada por ``hasta``
+    largo_hora = [60.0] * horas
+    largo_hora[-1] = total_min - (horas - 1) * 60 or 60.0
+
+    # Pico: al mismo minuto las salidas (-1) se ordenan antes que las entradas
+    pico, momento = 0, None
+    if eventos:
+        eventos.sort()
+        curva = list(accumulate(d for _, d in eventos))
+        pico = max(curva)
+        momento = desde + timedelta(minutes=eventos[curva.index(pico)][0])
+
+    total_plazas = sum(plazas_por_fila.values())
+
+    def fila_resultado(minutos, largo, plazas=total_plazas):
+        promedio = minutos / largo if largo else 0.0
+        return {
+            "promedio": round(promedio, 2),
+            "ocupacion": round(promedio / plazas, 4) if plazas else None,
+        }
+
+    por_hora = [[0.0, 0.0] for _ in range(24)]
+    por_dia = [[0.0, 0.0] for _ in range(7)]
+    hora0, dia0 = desde.hour, desde.weekday()
+    for k, (minutos, largo) in enumerate(zip(minutos_hora, largo_hora)):
+        h = hora0 + k
+        acumulado = por_hora[h % 24]
+        acumulado[0] += minutos
+        acumulado[1] += largo
+        acumulado = por_dia[(dia0 + h // 24) % 7]
+        acumulado[0] += minutos
+        acumulado[1] += largo
+
+    resultado = {
+        "desde": desde.isoformat(timespec="seconds"),
+        "hasta": hasta.isoformat(timespec="seconds"),
+        "total_plazas": total_plazas,
+        "general": fila_resultado(sum(minutos_hora), total_min),
+        "pico": {
+            "vehiculos": pico,
+            "momento": momento.isoformat(timespec="seconds") if momento else None,
+            "ocupacion": round(pico / total_plazas, 4) if total_plazas else None,
+        },
+        "por_hora": [
+            {"hora": h, **fila_resultado(m, l)} for h, (m, l) in enumerate(por_hora) if l
+        ],
+        "por_dia_semana": [
+            {"dia": d, "nombre": DIAS_SEMANA[d], **fila_resultado(m, l)}
+            for d, (m, l) in enumerate(por_dia) if l
+        ],
+        "por_fila": [
+            {"fila": f, "plazas": plazas_por_fila.get(f, 0),
+             **fila_resultado(minutos_fila.get(f, 0.0), total_min, plazas_por_fila.get(f, 0))}
+            for f in sorted(set(plazas_por_fila) | set(minutos_fila))
+        ],
+    }
+    if detalle:
+        resultado["serie"] = [
+            {"hora": (desde + timedelta(hours=k)).isoformat(timespec="seconds"),
+             **fila_resultado(m, l)}
+            for k, (m, l) in enumerate(zip(minutos_hora, largo_hora))
+        ]
+    return resultado
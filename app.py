@@ -1,16 +1,45 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, make_response, g
 from flask_cors import CORS
 from datetime import datetime, date  # ✅ importante: añadimos 'date'
 import json  # ✅ necesario para json.dumps(...)
+import base64
+import hashlib
 import os
+import time
+from functools import wraps
+from itertools import islice
 
-from models import db, Plaza, Vehiculo, Usuario, Configuracion, Cuadratura, HistorialSalida
-from sqlalchemy import func
+from models import (
+    db, Plaza, Vehiculo, Usuario, Configuracion, Cuadratura, HistorialSalida, ResumenSalida,
+    Estacionamiento,
+)
+from asignador import AsignadoresPorLote
+from cache import CacheLocal, por_lote
+import migraciones
+import basedatos
+import resumen
+import seguridad
+import eventos
+import metricas
+import exportacion
+import analitica
+import tarifas
+import trabajos
+import distribucion
+import busqueda
+import archivo
+from serializacion import proyectar, respuesta_json, dumps, iso, dos_decimales
+import queue
+import click
+from sqlalchemy import func, select, tuple_, insert, update, delete, case, literal
+from sqlalchemy.exc import IntegrityError
 from datetime import timedelta
 from calendar import monthrange
 
 app = Flask(__name__)
+if __name__ == "__main__":
+    app.debug = True     # python app.py: desarrollo local (ver app.run al final)
 CORS(app, resources={r"/*": {"origins": "https://mi-estacionav1.vercel.app"}}) #poner asi para vercel; CORS(app, resources={r"/*": {"origins": "https://mi-estacionav1.vercel.app"}})
 
 
@@ -18,32 +47,245 @@ CORS(app, resources={r"/*": {"origins": "https://mi-estacionav1.vercel.app"}}) #
 # Configuración de la base
 # ─────────────────────────────
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-app.config["SQLALCHEMY_DATABASE_URI"] = (
-    f"sqlite:///{os.path.join(BASE_DIR, 'database.db')}"
-)
+basedatos.configurar(app, BASE_DIR)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["TARIFA_POR_MINUTO"] = float(os.getenv("TARIFA_POR_MINUTO", 50))
+app.config["ASIGNADOR_REFRESCO_SEGUNDOS"] = float(
+    os.getenv("ASIGNADOR_REFRESCO_SEGUNDOS", 30)
+)
+app.config["SALIDAS_LIMITE_MAX"] = int(os.getenv("SALIDAS_LIMITE_MAX", 500))
+app.config["SALIDAS_LOTE_STREAM"] = int(os.getenv("SALIDAS_LOTE_STREAM", 500))
+app.config["LOTE_MAX"] = int(os.getenv("LOTE_MAX", 500))
+app.config["LAYOUT_LOG_PLAZAS"] = int(os.getenv("LAYOUT_LOG_PLAZAS", 500))
+app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+app.config["TOKEN_EXPIRA_SEGUNDOS"] = int(os.getenv("TOKEN_EXPIRA_SEGUNDOS", 12 * 3600))
+app.config["CACHE_TTL_SEGUNDOS"] = float(os.getenv("CACHE_TTL_SEGUNDOS", 30))
+app.config["CACHE_MAX_ENTRADAS"] = int(os.getenv("CACHE_MAX_ENTRADAS", 256))
+app.config["CACHE_INTERVALO_VERSION"] = float(os.getenv("CACHE_INTERVALO_VERSION", 1))
+app.config["SSE_INTERVALO_SEGUNDOS"] = float(os.getenv("SSE_INTERVALO_SEGUNDOS", 1))
+app.config["SSE_HEARTBEAT_SEGUNDOS"] = float(os.getenv("SSE_HEARTBEAT_SEGUNDOS", 15))
+app.config["WEB_CONEXIONES"] = int(os.getenv("WEB_CONEXIONES", 1000))   # ver gunicorn.conf.py
+# Cada cliente SSE es un greenlet del worker gevent; se deja al menos un
+# cuarto de las conexiones del worker para el resto de las rutas
+app.config["SSE_MAX_CLIENTES"] = min(
+    int(os.getenv("SSE_MAX_CLIENTES", 500)), app.config["WEB_CONEXIONES"] * 3 // 4
+)
+app.config["EVENTOS_RETENCION_SEGUNDOS"] = int(os.getenv("EVENTOS_RETENCION_SEGUNDOS", 600))
+app.config["BUSQUEDA_REFRESCO_SEGUNDOS"] = float(os.getenv("BUSQUEDA_REFRESCO_SEGUNDOS", 2))
+app.config["BUSQUEDA_LIMITE_MAX"] = int(os.getenv("BUSQUEDA_LIMITE_MAX", 50))
+app.config["CUADRATURA_TOLERANCIA"] = float(os.getenv("CUADRATURA_TOLERANCIA", 0))
+app.config["CUADRATURA_MAX_DIAS"] = int(os.getenv("CUADRATURA_MAX_DIAS", 92))
+app.config["CUADRATURA_CACHE_SEGUNDOS"] = float(os.getenv("CUADRATURA_CACHE_SEGUNDOS", 3600))
+# Sin valor por defecto: archivar borra filas de la BD y el directorio debe
+# ser durable y compartido (nunca el disco efímero de un dyno)
+app.config["ARCHIVO_DIR"] = os.getenv("ARCHIVO_DIR")
+app.config["ARCHIVO_MESES_CALIENTES"] = int(os.getenv("ARCHIVO_MESES_CALIENTES", 3))
+app.config["SMTP_HOST"] = os.getenv("SMTP_HOST")          # sin host no se encolan recibos
+app.config["SMTP_PORT"] = int(os.getenv("SMTP_PORT", 25))
+app.config["SMTP_TLS"] = os.getenv("SMTP_TLS", "0") == "1"
+app.config["SMTP_USUARIO"] = os.getenv("SMTP_USUARIO")
+app.config["SMTP_CONTRASEÑA"] = os.getenv("SMTP_CONTRASEÑA")
+app.config["SMTP_REMITENTE"] = os.getenv("SMTP_REMITENTE", "no-responder@miestaciona.cl")
+app.config["WEBHOOK_URL"] = os.getenv("WEBHOOK_URL")      # sin URL no se encolan webhooks
+app.config["TRABAJOS_LOTE"] = int(os.getenv("TRABAJOS_LOTE", 20))
+app.config["TRABAJOS_INTERVALO_SEGUNDOS"] = float(os.getenv("TRABAJOS_INTERVALO_SEGUNDOS", 1))
+app.config["TRABAJOS_MAX_INTENTOS"] = int(os.getenv("TRABAJOS_MAX_INTENTOS", 6))
+app.config["TRABAJOS_ESPERA_SEGUNDOS"] = float(os.getenv("TRABAJOS_ESPERA_SEGUNDOS", 10))
+app.config["TRABAJOS_ESPERA_MAX_SEGUNDOS"] = float(os.getenv("TRABAJOS_ESPERA_MAX_SEGUNDOS", 3600))
+app.config["TRABAJOS_VISIBILIDAD_SEGUNDOS"] = int(os.getenv("TRABAJOS_VISIBILIDAD_SEGUNDOS", 300))
+app.config["TRABAJOS_RETENCION_SEGUNDOS"] = int(os.getenv("TRABAJOS_RETENCION_SEGUNDOS", 7 * 86400))
+if os.getenv("METRICAS_DIR"):
+    app.config["METRICAS_DIR"] = os.getenv("METRICAS_DIR")
 
 db.init_app(app)
+basedatos.init_app(app)
+seguridad.init_app(app)
+metricas.init_app(app)
+asignadores = AsignadoresPorLote(app.config["ASIGNADOR_REFRESCO_SEGUNDOS"])
+cache = CacheLocal(
+    ttl=app.config["CACHE_TTL_SEGUNDOS"],
+    maximo=app.config["CACHE_MAX_ENTRADAS"],
+    intervalo_version=app.config["CACHE_INTERVALO_VERSION"],
+)
+indices_patentes = busqueda.IndicesPorLote(app.config["BUSQUEDA_REFRESCO_SEGUNDOS"])
+archivo_salidas = archivo.Archivo(app.config["ARCHIVO_DIR"])
+difusor = eventos.Difusor(
+    app,
+    intervalo=app.config["SSE_INTERVALO_SEGUNDOS"],
+    max_clientes=app.config["SSE_MAX_CLIENTES"],
+)
+
+# ─────────────────────────────
+# Estacionamiento de la petición
+# ─────────────────────────────
+def estacionamientos_ids():
+    return cache.obtener(
+        "estacionamientos", ("estacionamientos",),
+        lambda: set(db.session.scalars(select(Estacionamiento.id))),
+    )
+
+@app.before_request
+def elegir_estacionamiento():
+    """Header X-Estacionamiento o ?estacionamiento=; sin ninguno, el 1."""
+    valor = request.headers.get("X-Estacionamiento") or request.args.get("estacionamiento")
+    if valor is None:
+        return
+    try:
+        lote = int(valor)
+    except ValueError:
+        return jsonify({"error": "Estacionamiento inválido"}), 400
+    if lote not in estacionamientos_ids():
+        return jsonify({"error": "Estacionamiento no encontrado"}), 404
+    g.estacionamiento = lote
+
+def lote_actual():
+    return g.get("estacionamiento", 1)
+
+def espacios(*nombres):
+    """Espacios de caché del estacionamiento actual ("plazas" → "plazas:2")."""
+    return por_lote(lote_actual(), *nombres)
+
+def asignador():
+    return asignadores(lote_actual())
 
 # ─────────────────────────────
 # Utilidades
 # ─────────────────────────────
 
-def plaza_libre():
-    """Devuelve la primera Plaza libre según orden fila+numero, o None."""
-    return (
-        Plaza.query.filter_by(ocupado=False)
-        .order_by(Plaza.fila, Plaza.numero)
-        .first()
-    )
+def reclamar_plaza():
+    """Ocupa la primera Plaza libre según orden fila+numero y la devuelve, o None.
+
+    El cambio queda en la transacción actual: hay que hacer commit o rollback.
+    """
+    plazas = asignador().reclamar()
+    return plazas[0] if plazas else None
 
 def plazas_disponibles():
-    return Plaza.query.filter_by(ocupado=False).count()
+    lote = lote_actual()
+    return cache.obtener(
+        f"disponibles:{lote}", espacios("plazas"),
+        lambda: Plaza.query.filter_by(estacionamiento_id=lote, ocupado=False).count(),
+    )
+
+def config_actual():
+    """Configuración del estacionamiento como dict (cacheada), o None si no existe."""
+    lote = lote_actual()
+    def leer():
+        config = Configuracion.query.filter_by(estacionamiento_id=lote).first()
+        if not config:
+            return None
+        return {
+            "nombre": config.nombre,
+            "apertura": config.apertura,
+            "cierre": config.cierre,
+            "tarifa": config.tarifa,
+            **{campo: getattr(config, campo) for campo in CAMPOS_TARIFA},
+        }
+    return cache.obtener(f"configuracion:{lote}", espacios("configuracion"), leer)
+
+def trabajador_actual_id():
+    """Id del usuario del token (quien cobra), o None sin sesión."""
+    usuario = seguridad.usuario_del_token()
+    return usuario.id if usuario else None
+
+def registrar_cambios(cambios):
+    """Publica cambios (codigo, ocupado) para /plazas/stream en la transacción actual."""
+    eventos.registrar(
+        cambios, lote_actual(), retencion=app.config["EVENTOS_RETENCION_SEGUNDOS"]
+    )
+
+# Reglas opcionales de Configuracion que usa el motor de tarifas
+CAMPOS_TARIFA = ("primera_hora", "tope_diario", "tarifa_nocturna", "noche_inicio", "noche_fin")
 
-def calcular_total(hora_entrada: datetime, tarifa: float):
-    minutos = (datetime.now() - hora_entrada).total_seconds() / 60
-    return minutos, round(minutos * tarifa, 0)
+def encolar_avisos(evento, registros):
+    """Encola recibos (salidas con correo) y webhooks en la transacción actual.
+
+    registros: dicts con patente, correo, posicion, entrada y, en salidas,
+    salida, minutos y total.
+    """
+    if evento == "salida" and app.config["SMTP_HOST"]:
+        trabajos.encolar("recibo", *(r for r in registros if r.get("correo")))
+    if app.config["WEBHOOK_URL"]:
+        trabajos.encolar("webhook", *(
+            {"evento": evento, "estacionamiento": lote_actual(), **r} for r in registros
+        ))
+
+def tarifario_vigente():
+    """Tarifario compilado desde Configuracion (TARIFA_POR_MINUTO si no hay tarifa)."""
+    return cache.obtener(
+        f"tarifario:{lote_actual()}", espacios("configuracion"),
+        lambda: tarifas.compilar(config_actual(), app.config["TARIFA_POR_MINUTO"]),
+    )
+
+def calcular_total(hora_entrada: datetime, tarifario, ahora: datetime = None):
+    return tarifario.cotizar(hora_entrada, ahora or datetime.now())
+
+def con_etag(*nombres):
+    """ETag fuerte a partir de las versiones de caché de los espacios
+    (los del estacionamiento de la petición).
+
+    Si el cliente manda un If-None-Match que coincide, responde 304 sin
+    ejecutar la vista (sin consultar tablas ni serializar JSON).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envuelta(*args, **kwargs):
+            versiones = cache.versiones(forzar=True)
+            lote = lote_actual()
+            marca = "|".join(
+                f"{e}:{versiones.get(e, 0)}" for e in por_lote(lote, *nombres)
+            )
+            etag = hashlib.sha1(
+                f"{request.full_path}|{lote}|{marca}".encode()
+            ).hexdigest()
+            if request.if_none_match.contains(etag):
+                respuesta = Response(status=304)
+            else:
+                respuesta = make_response(vista(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+            respuesta.set_etag(etag)
+            respuesta.headers["Cache-Control"] = "no-cache"
+            respuesta.vary.add("X-Estacionamiento")
+            return respuesta
+        return envuelta
+    return decorador
+
+def texto(valor, columna, opcional=False):
+    """``valor`` si es un string no vacío que cabe en ``columna``; si no, ValueError."""
+    if opcional and valor is None:
+        return None
+    if not isinstance(valor, str) or not valor or len(valor) > columna.type.length:
+        raise ValueError(f"{columna.key} inválido")
+    return valor
+
+def parsear_fecha(valor: str, fin: bool = False):
+    """Fecha ISO del querystring. Con fin=True una fecha sin hora cubre el día completo."""
+    fecha = datetime.fromisoformat(valor)
+    if fin and len(valor) == 10:
+        fecha += timedelta(days=1) - timedelta(microseconds=1)
+    return fecha
+
+def codificar_cursor(hora_salida: datetime, id_: int):
+    crudo = f"{hora_salida.isoformat()}|{id_}".encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str):
+    crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    hora, id_ = crudo.split("|")
+    return datetime.fromisoformat(hora), int(id_)
+
+def stream_json(partes):
+    """Genera un arreglo JSON a partir de lotes de dicts, sin armarlo en memoria."""
+    yield "["
+    primero = True
+    for lote in partes:
+        if not lote:
+            continue
+        texto = ",".join(dumps(d) for d in lote)
+        yield texto if primero else "," + texto
+        primero = False
+    yield "]"
 
 # ─────────────────────────────
 # Rutas
@@ -52,6 +294,18 @@ def calcular_total(hora_entrada: datetime, tarifa: float):
 def home():
     return "MiEstaciona API corriendo"
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Métricas de todos los workers en formato de texto de Prometheus."""
+    return metricas.respuesta_metricas(
+        app, adicional=trabajos.texto_prometheus(trabajos.estado())
+    )
+
+@app.route("/trabajos/estado", methods=["GET"])
+def estado_trabajos():
+    """Profundidad de la cola de trabajos y latencia reciente."""
+    return respuesta_json(trabajos.estado())
+
 # ---------- Disponibilidad ----------
 @app.route("/espacios_disponibles", methods=["GET"])
 def espacios_disponibles():
@@ -61,9 +315,10 @@ def espacios_disponibles():
 @app.route("/registrar_vehiculo", methods=["POST"])
 def registrar_vehiculo():
     data = request.get_json()
-    plaza = plaza_libre()
+    plaza = reclamar_plaza()
     if not plaza:
         return jsonify({"error": "Estacionamiento lleno"}), 400
+    tomada = (plaza.id, plaza.fila, plaza.numero)
 
     try:
         nuevo = Vehiculo(
@@ -72,9 +327,15 @@ def registrar_vehiculo():
             correo=data.get("correo"),
             hora_entrada=datetime.fromisoformat(data["hora_entrada"]),
             plaza=plaza,
+            estacionamiento_id=plaza.estacionamiento_id,
         )
-        plaza.ocupado = True
         db.session.add(nuevo)
+        registrar_cambios([(plaza.codigo, True)])
+        encolar_avisos("ingreso", [{
+            "patente": nuevo.patente, "correo": nuevo.correo,
+            "posicion": plaza.codigo, "entrada": iso(nuevo.hora_entrada),
+        }])
+        cache.invalidar(*espacios("plazas", "vehiculos"))
         db.session.commit()
         return (
             jsonify(
@@ -85,56 +346,106 @@ def registrar_vehiculo():
             ),
             201,
         )
-    except Exception as e:
-        print("Error:", e)
+    except IntegrityError:
         db.session.rollback()
+        asignador().liberar(*tomada)
+        return jsonify({"error": "Vehículo ya registrado"}), 400
+    except Exception:
+        app.logger.exception("Error al registrar vehículo")
+        db.session.rollback()
+        asignador().liberar(*tomada)
         return jsonify({"error": "Error al registrar vehículo"}), 500
 
 @app.route("/vehiculo/manual", methods=["POST"])
 def registrar_ingreso_manual():
-    data  = request.json
-    plaza = plaza_libre()
+    data = request.get_json(silent=True)
+    # Se valida antes de reclamar: un error después dejaría la plaza fuera del heap
+    try:
+        patente = texto(data["patente"], Vehiculo.patente)
+        conductor = texto(data["conductor"], Vehiculo.conductor)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Datos inválidos"}), 400
+    plaza = reclamar_plaza()
     if not plaza:
         return jsonify({"error": "Estacionamiento lleno"}), 400
+    tomada = (plaza.id, plaza.fila, plaza.numero)
 
-    nuevo = Vehiculo(
-        patente=data["patente"],
-        conductor=data["conductor"],
-        hora_entrada=datetime.now(),
-        plaza=plaza,
-    )
-    plaza.ocupado = True
-    db.session.add(nuevo)
-    db.session.commit()
+    try:
+        nuevo = Vehiculo(
+            patente=patente,
+            conductor=conductor,
+            hora_entrada=datetime.now(),
+            plaza=plaza,
+            estacionamiento_id=plaza.estacionamiento_id,
+        )
+        db.session.add(nuevo)
+        registrar_cambios([(plaza.codigo, True)])
+        encolar_avisos("ingreso", [{
+            "patente": nuevo.patente, "correo": None,
+            "posicion": plaza.codigo, "entrada": iso(nuevo.hora_entrada),
+        }])
+        cache.invalidar(*espacios("plazas", "vehiculos"))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        asignador().liberar(*tomada)
+        return jsonify({"error": "Vehículo ya registrado"}), 400
+    except Exception:
+        app.logger.exception("Error al registrar ingreso manual")
+        db.session.rollback()
+        asignador().liberar(*tomada)
+        return jsonify({"error": "Error al registrar vehículo"}), 500
     return jsonify({"mensaje": "Ingreso manual registrado"}), 201
 
 @app.route("/vehiculo/<patente>", methods=["DELETE"])
 def cobrar_y_eliminar(patente):
-    vehiculo = Vehiculo.query.filter_by(patente=patente).first()
+    vehiculo = Vehiculo.query.filter(
+        Vehiculo.estacionamiento_id == lote_actual(),
+        Vehiculo.patente == patente,
+        Vehiculo.hora_salida.is_(None),
+    ).first()
     if not vehiculo:
         return jsonify({"error": "Vehículo no encontrado"}), 404
 
-    minutos, total = calcular_total(
-        vehiculo.hora_entrada, app.config["TARIFA_POR_MINUTO"]
-    )
+    ahora = datetime.now()
+    minutos, total = calcular_total(vehiculo.hora_entrada, tarifario_vigente(), ahora)
 
     historial = HistorialSalida(
+        estacionamiento_id=vehiculo.estacionamiento_id,
         patente=vehiculo.patente,
         conductor=vehiculo.conductor,
         correo=vehiculo.correo,
         hora_entrada=vehiculo.hora_entrada,
-        hora_salida=datetime.now(),
+        hora_salida=ahora,
         duracion_minutos=round(minutos, 2),
         total_pagado=total,
-        posicion=vehiculo.posicion
+        posicion=vehiculo.posicion,
+        trabajador_id=trabajador_actual_id(),
     )
     db.session.add(historial)
+    resumen.acumular(
+        db.session,
+        [(historial.hora_salida, historial.total_pagado, historial.duracion_minutos)],
+        vehiculo.estacionamiento_id,
+    )
 
-    if vehiculo.plaza:
-        vehiculo.plaza.ocupado = False
+    plaza = vehiculo.plaza
+    liberada = (plaza.id, plaza.fila, plaza.numero) if plaza else None
+    if plaza:
+        plaza.ocupado = False
+        registrar_cambios([(plaza.codigo, False)])
+    encolar_avisos("salida", [{
+        "patente": historial.patente, "correo": historial.correo,
+        "posicion": historial.posicion, "entrada": iso(historial.hora_entrada),
+        "salida": iso(historial.hora_salida), "minutos": historial.duracion_minutos,
+        "total": historial.total_pagado,
+    }])
 
     db.session.delete(vehiculo)
+    cache.invalidar(*espacios("plazas", "vehiculos"))
     db.session.commit()
+    if liberada:
+        asignador().liberar(*liberada)
 
     return jsonify(
         {
@@ -144,42 +455,487 @@ def cobrar_y_eliminar(patente):
         }
     )
 
+# ---------- Lotes ----------
+@app.route("/vehiculos/batch", methods=["POST"])
+def registrar_vehiculos_lote():
+    """Registra muchos ingresos en una sola transacción.
+
+    Body: {"vehiculos": [{"patente", "conductor", "correo"?, "hora_entrada"?}, ...]}
+    Devuelve un resultado por ítem, en el mismo orden.
+    """
+    items = (request.get_json() or {}).get("vehiculos")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Se espera una lista 'vehiculos'"}), 400
+    if len(items) > app.config["LOTE_MAX"]:
+        return jsonify({"error": f"Máximo {app.config['LOTE_MAX']} por lote"}), 400
+
+    resultados = [None] * len(items)
+    validos = []  # (indice, fila para vehiculos)
+    vistas = set()
+    for i, item in enumerate(items):
+        try:
+            patente = texto(item["patente"], Vehiculo.patente)
+            fila = {
+                "estacionamiento_id": lote_actual(),
+                "patente": patente,
+                "conductor": texto(item["conductor"], Vehiculo.conductor),
+                "correo": texto(item.get("correo"), Vehiculo.correo, opcional=True),
+                "hora_entrada": (
+                    datetime.fromisoformat(item["hora_entrada"])
+                    if item.get("hora_entrada") else datetime.now()
+                ),
+            }
+        except (KeyError, TypeError, ValueError, AttributeError):
+            patente = item.get("patente") if isinstance(item, dict) else None
+            resultados[i] = {"patente": patente if isinstance(patente, str) else None,
+                             "ok": False, "error": "Datos inválidos"}
+            continue
+        if patente in vistas:
+            resultados[i] = {"patente": patente, "ok": False, "error": "Patente repetida en el lote"}
+            continue
+        vistas.add(patente)
+        validos.append((i, fila))
+
+    estacionadas = set(
+        db.session.scalars(
+            select(Vehiculo.patente).where(
+                Vehiculo.estacionamiento_id == lote_actual(),
+                Vehiculo.patente.in_(vistas),
+                Vehiculo.hora_salida.is_(None),
+            )
+        )
+    )
+    pendientes = []
+    for i, fila in validos:
+        if fila["patente"] in estacionadas:
+            resultados[i] = {"patente": fila["patente"], "ok": False, "error": "Vehículo ya registrado"}
+        else:
+            pendientes.append((i, fila))
+
+    plazas = asignador().reclamar(len(pendientes)) if pendientes else []
+    tomadas = [(p.id, p.fila, p.numero) for p in plazas]
+    nuevos = []
+    for (i, fila), plaza in zip(pendientes, plazas):
+        nuevos.append({**fila, "plaza_id": plaza.id})
+        resultados[i] = {"patente": fila["patente"], "ok": True, "numero_estacionamiento": plaza.codigo}
+    for i, fila in pendientes[len(plazas):]:
+        resultados[i] = {"patente": fila["patente"], "ok": False, "error": "Estacionamiento lleno"}
+
+    try:
+        if nuevos:
+            db.session.execute(insert(Vehiculo), nuevos)
+            registrar_cambios([(p.codigo, True) for p in plazas])
+            encolar_avisos("ingreso", [
+                {"patente": n["patente"], "correo": n.get("correo"),
+                 "posicion": p.codigo, "entrada": iso(n["hora_entrada"])}
+                for n, p in zip(nuevos, plazas)
+            ])
+        cache.invalidar(*espacios("plazas", "vehiculos"))
+        db.session.commit()
+    except Exception:
+        app.logger.exception("Error al registrar el lote de vehículos")
+        db.session.rollback()
+        for t in tomadas:
+            asignador().liberar(*t)
+        return jsonify({"error": "Error al registrar vehículos"}), 500
+
+    return jsonify({"registrados": len(nuevos), "resultados": resultados})
+
+@app.route("/salidas/batch", methods=["POST"])
+def cobrar_lote():
+    """Cobra y retira muchos vehículos en una sola transacción.
+
+    Body: {"patentes": ["AB1234", ...]}. Devuelve un resultado por patente.
+    """
+    patentes = (request.get_json() or {}).get("patentes")
+    if not isinstance(patentes, list) or not patentes:
+        return jsonify({"error": "Se espera una lista 'patentes'"}), 400
+    if len(patentes) > app.config["LOTE_MAX"]:
+        return jsonify({"error": f"Máximo {app.config['LOTE_MAX']} por lote"}), 400
+
+    validas = set()
+    for p in patentes:
+        try:
+            validas.add(texto(p, Vehiculo.patente))
+        except ValueError:
+            pass
+    activos = db.session.execute(
+        select(
+            Vehiculo.id, Vehiculo.patente, Vehiculo.conductor, Vehiculo.correo,
+            Vehiculo.hora_entrada, Vehiculo.plaza_id,
+            Plaza.fila, Plaza.numero, Plaza.codigo,
+        )
+        .join(Plaza)
+        .where(
+            Vehiculo.estacionamiento_id == lote_actual(),
+            Vehiculo.patente.in_(validas),
+            Vehiculo.hora_salida.is_(None),
+        )
+    ).all() if validas else []
+    datos = {}
+    if activos:
+        # El DELETE ... RETURNING decide quién cobra: si otro worker ya
+        # retiró el vehículo, simplemente no vuelve en el resultado.
+        retirados = set(db.session.scalars(
+            delete(Vehiculo)
+            .where(Vehiculo.id.in_([v.id for v in activos]))
+            .returning(Vehiculo.id)
+        ))
+        datos = {v.id: v for v in activos if v.id in retirados}
+
+    ahora = datetime.now()
+    tarifario = tarifario_vigente()
+    trabajador_id = trabajador_actual_id()
+    historial, por_patente = [], {}
+    for v in datos.values():
+        minutos, total = calcular_total(v.hora_entrada, tarifario, ahora)
+        historial.append({
+            "estacionamiento_id": lote_actual(),
+            "patente": v.patente,
+            "conductor": v.conductor,
+            "correo": v.correo,
+            "hora_entrada": v.hora_entrada,
+            "hora_salida": ahora,
+            "duracion_minutos": round(minutos, 2),
+            "total_pagado": total,
+            "posicion": v.codigo,
+            "trabajador_id": trabajador_id,
+        })
+        por_patente[v.patente] = {"patente": v.patente, "ok": True,
+                                  "total_pagar": total, "minutos": round(minutos, 2)}
+
+    if historial:
+        db.session.execute(insert(HistorialSalida), historial)
+        db.session.execute(
+            update(Plaza)
+            .where(Plaza.id.in_([v.plaza_id for v in datos.values()]))
+            .values(ocupado=False)
+        )
+        resumen.acumular(
+            db.session,
+            [(h["hora_salida"], h["total_pagado"], h["duracion_minutos"]) for h in historial],
+            lote_actual(),
+        )
+        registrar_cambios([(v.codigo, False) for v in datos.values()])
+        encolar_avisos("salida", [
+            {"patente": h["patente"], "correo": h["correo"], "posicion": h["posicion"],
+             "entrada": iso(h["hora_entrada"]), "salida": iso(h["hora_salida"]),
+             "minutos": h["duracion_minutos"], "total": h["total_pagado"]}
+            for h in historial
+        ])
+    cache.invalidar(*espacios("plazas", "vehiculos"))
+    db.session.commit()
+    for v in datos.values():
+        asignador().liberar(v.plaza_id, v.fila, v.numero)
+
+    resultados = []
+    for p in patentes:
+        if not isinstance(p, str) or p not in validas:
+            resultados.append({"patente": p if isinstance(p, str) else None,
+                               "ok": False, "error": "Patente inválida"})
+        elif p in por_patente:
+            resultados.append(por_patente.pop(p))
+        else:
+            resultados.append({"patente": p, "ok": False, "error": "Vehículo no encontrado"})
+    return jsonify({
+        "cobrados": len(historial),
+        "total_pagar": sum(h["total_pagado"] for h in historial),
+        "resultados": resultados,
+    })
+
+@app.route("/cobros/preview", methods=["GET"])
+def cobros_preview():
+    """Cotiza de una vez todos los vehículos estacionados (pantalla de caja).
+
+    No modifica nada: usa el mismo tarifario que el cobro y la misma hora
+    de referencia para todos.
+    """
+    ahora = datetime.now()
+    tarifario = tarifario_vigente()
+    filas = db.session.execute(
+        select(Vehiculo.patente, Vehiculo.hora_entrada, Plaza.codigo)
+        .join(Plaza)
+        .where(Vehiculo.estacionamiento_id == lote_actual())
+        .order_by(Plaza.fila, Plaza.numero)
+    )
+    cobros = []
+    for patente, hora_entrada, codigo in filas:
+        minutos, total = tarifario.cotizar(hora_entrada, ahora)
+        cobros.append({
+            "patente": patente,
+            "posicion": codigo,
+            "entrada": iso(hora_entrada),
+            "minutos": round(minutos, 2),
+            "total_pagar": total,
+        })
+    return respuesta_json({
+        "calculado": iso(ahora),
+        "vehiculos": len(cobros),
+        "total_pagar": sum(c["total_pagar"] for c in cobros),
+        "cobros": cobros,
+    })
+
+CAMPOS_HISTORIAL = (
+    ("patente", None),
+    ("conductor", None),
+    ("correo", None),
+    ("entrada", iso),
+    ("posicion", None),
+)
+
 @app.route("/historial", methods=["GET"])
+@con_etag("vehiculos")
 def historial():
-    vehiculos = (
-        Vehiculo.query.join(Plaza)
+    filas = db.session.execute(
+        select(
+            Vehiculo.patente, Vehiculo.conductor, Vehiculo.correo,
+            Vehiculo.hora_entrada, Plaza.codigo,
+        )
+        .join(Plaza)
+        .where(Vehiculo.estacionamiento_id == lote_actual())
         .order_by(Plaza.fila, Plaza.numero)
-        .all()
     )
-    return jsonify(
-        [
-            {
-                "patente": v.patente,
-                "conductor": v.conductor,
-                "correo": v.correo,
-                "entrada": v.hora_entrada.isoformat(timespec="seconds"),
-                "posicion": v.posicion,
-            }
-            for v in vehiculos
-        ]
+    return respuesta_json(proyectar(filas, CAMPOS_HISTORIAL))
+
+@app.route("/buscar", methods=["GET"])
+def buscar_patente():
+    """Patentes estacionadas e históricas que empiezan con ``q`` o están a
+    distancia de edición 1–2 (lectura parcial o equivocada de la patente).
+
+    ?q=, ?limite= (por grupo) y ?distancia= (0 a 2; por defecto 1 hasta 4
+    caracteres y 2 desde 5). Mayúsculas, guiones y espacios no importan.
+    """
+    consulta = busqueda.normalizar(request.args.get("q"))
+    if len(consulta) < 2:
+        return jsonify({"error": "La búsqueda necesita al menos 2 caracteres"}), 400
+    limite = max(1, min(request.args.get("limite", 20, type=int),
+                        app.config["BUSQUEDA_LIMITE_MAX"]))
+    maximo = request.args.get("distancia", 1 if len(consulta) <= 4 else 2, type=int)
+    maximo = max(0, min(maximo, 2))
+    lote = lote_actual()
+
+    def coincidencia(clave, d=None):
+        if clave == consulta:
+            return (0, "exacta", 0)
+        if clave.startswith(consulta):
+            return (1, "prefijo", 0)
+        d = busqueda.distancia(clave, consulta, maximo) if d is None else d
+        return (2, "aproximada", d) if d <= maximo else None
+
+    activos = []
+    for v in db.session.execute(
+        select(Vehiculo.patente, Vehiculo.conductor, Vehiculo.hora_entrada, Plaza.codigo)
+        .join(Plaza)
+        .where(Vehiculo.estacionamiento_id == lote, Vehiculo.hora_salida.is_(None))
+    ):
+        orden = coincidencia(busqueda.normalizar(v.patente))
+        if orden:
+            activos.append((orden, v))
+    activos.sort(key=lambda a: (a[0][0], a[0][2], a[1].patente))
+
+    indice = indices_patentes(lote)
+    candidatas = {c: coincidencia(c) for c in indice.por_prefijo(consulta, limite)}
+    if maximo:
+        for d, c in indice.aproximadas(consulta, maximo):
+            candidatas.setdefault(c, coincidencia(c, d))
+    elegidas = sorted(candidatas.items(), key=lambda c: (c[1][0], c[1][2], c[0]))[:limite]
+    visitas = {}
+    if elegidas:
+        formas = set().union(*(indice.formas(c) for c, _ in elegidas))
+        for patente, cantidad, ultima in db.session.execute(
+            select(HistorialSalida.patente, func.count(), func.max(HistorialSalida.hora_salida))
+            .where(
+                HistorialSalida.estacionamiento_id == lote,
+                HistorialSalida.patente.in_(formas),
+            )
+            .group_by(HistorialSalida.patente)
+        ):
+            clave = busqueda.normalizar(patente)
+            previa = visitas.get(clave, (0, None))
+            visitas[clave] = (previa[0] + cantidad, max(filter(None, (previa[1], ultima))))
+
+    return respuesta_json({
+        "q": consulta,
+        "distancia": maximo,
+        "activos": [
+            {"patente": v.patente, "conductor": v.conductor, "entrada": iso(v.hora_entrada),
+             "posicion": v.codigo, "coincidencia": orden[1], "distancia": orden[2]}
+            for orden, v in activos[:limite]
+        ],
+        "historial": [
+            {"patente": clave, "visitas": visitas[clave][0],
+             "ultima_salida": iso(visitas[clave][1]),
+             "coincidencia": orden[1], "distancia": orden[2]}
+            for clave, orden in elegidas if clave in visitas
+        ],
+    })
+
+
+# El id va al final: lo usa el cursor y proyectar() lo ignora
+COLUMNAS_SALIDA = (
+    HistorialSalida.patente,
+    HistorialSalida.conductor,
+    HistorialSalida.correo,
+    HistorialSalida.hora_entrada,
+    HistorialSalida.hora_salida,
+    HistorialSalida.duracion_minutos,
+    HistorialSalida.total_pagado,
+    HistorialSalida.posicion,
+    HistorialSalida.id,
+)
+CAMPOS_SALIDA = (
+    ("patente", None),
+    ("conductor", None),
+    ("correo", None),
+    ("entrada", iso),
+    ("salida", iso),
+    ("duracion", dos_decimales),
+    ("total", None),
+    ("posicion", None),
+)
+
+CLAVES_SALIDA = tuple(c.key for c in COLUMNAS_SALIDA)
+
+def filtros_salidas():
+    """patente/desde/hasta del querystring. ValueError si una fecha es inválida."""
+    return {
+        "patente": request.args.get("patente") or None,
+        "desde": parsear_fecha(request.args["desde"]) if request.args.get("desde") else None,
+        "hasta": (
+            parsear_fecha(request.args["hasta"], fin=True) if request.args.get("hasta") else None
+        ),
+    }
+
+def filtrar_salidas(consulta, filtros):
+    """Aplica el estacionamiento y los filtros de filtros_salidas()."""
+    consulta = consulta.where(HistorialSalida.estacionamiento_id == lote_actual())
+    if filtros["patente"]:
+        consulta = consulta.where(HistorialSalida.patente == filtros["patente"])
+    if filtros["desde"]:
+        consulta = consulta.where(HistorialSalida.hora_salida >= filtros["desde"])
+    if filtros["hasta"]:
+        consulta = consulta.where(HistorialSalida.hora_salida <= filtros["hasta"])
+    return consulta
+
+def salidas_archivadas(filtros, descendente=False, antes_de=None):
+    """Salidas del archivo, de a una, con las mismas columnas que COLUMNAS_SALIDA.
+    Siempre son anteriores a las de la tabla: van después (o antes, en orden
+    cronológico) sin mezclar."""
+    return archivo_salidas.salidas(
+        lote_actual(), CLAVES_SALIDA, descendente=descendente, antes_de=antes_de, **filtros
     )
 
+def en_lotes(filas, tamaño):
+    """Agrupa un iterable en listas de ``tamaño`` (la última puede ser menor)."""
+    filas = iter(filas)
+    while lote := list(islice(filas, tamaño)):
+        yield lote
+
 @app.route("/salidas", methods=["GET"])
 def ver_salidas():
-    salidas = HistorialSalida.query.order_by(HistorialSalida.hora_salida.desc()).all()
-    return jsonify([
-        {
-            "patente": s.patente,
-            "conductor": s.conductor,
-            "correo": s.correo,
-            "entrada": s.hora_entrada.isoformat(timespec="seconds"),
-            "salida": s.hora_salida.isoformat(timespec="seconds"),
-            "duracion": round(s.duracion_minutos, 2),
-            "total": s.total_pagado,
-            "posicion": s.posicion,
-        }
-        for s in salidas
-    ])
+    """Historial de salidas, de la más reciente a la más antigua.
+
+    Filtros opcionales: patente, desde, hasta (ISO). Con ``limite`` o
+    ``cursor`` responde una página y el cursor de la siguiente; sin ellos
+    transmite el arreglo completo por lotes, con memoria constante.
+    """
+    consulta = select(*COLUMNAS_SALIDA).order_by(
+        HistorialSalida.hora_salida.desc(), HistorialSalida.id.desc()
+    )
+    try:
+        filtros = filtros_salidas()
+    except ValueError:
+        return jsonify({"error": "Fecha inválida"}), 400
+    consulta = filtrar_salidas(consulta, filtros)
+
+    if "limite" not in request.args and "cursor" not in request.args:
+        def lotes():
+            resultado = db.session.execute(
+                consulta.execution_options(yield_per=app.config["SALIDAS_LOTE_STREAM"])
+            )
+            for particion in resultado.partitions():
+                yield proyectar(particion, CAMPOS_SALIDA)
+            for particion in en_lotes(
+                salidas_archivadas(filtros, descendente=True), app.config["SALIDAS_LOTE_STREAM"]
+            ):
+                yield proyectar(particion, CAMPOS_SALIDA)
+
+        return Response(
+            stream_with_context(stream_json(lotes())), mimetype="application/json"
+        )
+
+    try:
+        limite = min(
+            int(request.args.get("limite", 100)), app.config["SALIDAS_LIMITE_MAX"]
+        )
+        if limite < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Límite inválido"}), 400
+    cursor = None
+    if request.args.get("cursor"):
+        try:
+            cursor = decodificar_cursor(request.args["cursor"])
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"error": "Cursor inválido"}), 400
+        consulta = consulta.where(
+            tuple_(HistorialSalida.hora_salida, HistorialSalida.id) < tuple_(*cursor)
+        )
+
+    filas = db.session.execute(consulta.limit(limite + 1)).all()
+    if len(filas) <= limite:
+        # La tabla se acabó: la página sigue con el archivo desde el cursor
+        filas += islice(
+            salidas_archivadas(filtros, descendente=True, antes_de=cursor),
+            limite + 1 - len(filas),
+        )
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(filas[-1].hora_salida, filas[-1].id)
+    return respuesta_json({
+        "salidas": proyectar(filas, CAMPOS_SALIDA),
+        "siguiente": siguiente,
+    })
+
+@app.route("/salidas/export", methods=["GET"])
+def exportar_salidas():
+    """Exporta salidas en orden cronológico como CSV o NDJSON para contabilidad.
+
+    Filtros: desde, hasta, patente. ``formato`` = csv (defecto) o ndjson;
+    ``gzip=1`` comprime al vuelo. Incluye subtotales por día y un total final.
+    """
+    formato = request.args.get("formato", "csv")
+    if formato not in exportacion.FORMATOS:
+        return jsonify({"error": "Formato inválido"}), 400
+    consulta = select(*COLUMNAS_SALIDA).order_by(
+        HistorialSalida.hora_salida, HistorialSalida.id
+    )
+    try:
+        filtros = filtros_salidas()
+    except ValueError:
+        return jsonify({"error": "Fecha inválida"}), 400
+    consulta = filtrar_salidas(consulta, filtros)
+
+    def lotes():
+        yield from en_lotes(salidas_archivadas(filtros), app.config["SALIDAS_LOTE_STREAM"])
+        # yield_per abre un cursor del lado del servidor en PostgreSQL
+        resultado = db.session.execute(
+            consulta.execution_options(yield_per=app.config["SALIDAS_LOTE_STREAM"])
+        )
+        yield from resultado.partitions()
+
+    comprimido = request.args.get("gzip") in ("1", "true")
+    partes, mimetype, extension = exportacion.exportar(lotes(), formato, comprimido)
+    nombre = "salidas"
+    for clave in ("desde", "hasta"):
+        if request.args.get(clave):
+            nombre += "_" + request.args[clave][:10]
+    return Response(
+        stream_with_context(partes),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{extension}"'},
+    )
 
 @app.route("/estadisticas/salidas", methods=["GET"])
 def estadisticas_salidas():
@@ -188,58 +944,83 @@ def estadisticas_salidas():
 
     hoy = datetime.now()
 
+    if inicio_str:
+        try:
+            inicio = datetime.fromisoformat(inicio_str)
+        except Exception:
+            return jsonify({"error": "Fecha de inicio inválida"}), 400
+
     if modo == "semana":
-        if inicio_str:
-            try:
-                inicio = datetime.fromisoformat(inicio_str)
-                inicio = datetime(inicio.year, inicio.month, inicio.day, 0, 0, 0)  # fuerza hora exacta
-            except Exception:
-                return jsonify({"error": "Fecha de inicio inválida"}), 400
-        else:
+        if not inicio_str:
             inicio = hoy - timedelta(days=6)
-        fin = (inicio + timedelta(days=6)).replace(hour=23, minute=59, second=59, microsecond=999999)
-        agrupamiento = func.date(HistorialSalida.hora_salida)
-
+        fin = inicio + timedelta(days=6)
     elif modo == "mes":
-        if inicio_str:
-            try:
-                inicio = datetime.fromisoformat(inicio_str)
-                inicio = datetime(inicio.year, inicio.month, inicio.day, 0, 0, 0)  # fuerza hora exacta
-            except Exception:
-                return jsonify({"error": "Fecha de inicio inválida"}), 400
-        else:
+        if not inicio_str:
             inicio = hoy - timedelta(weeks=4)
-        ultimo_dia = monthrange(inicio.year, inicio.month)[1]
-        fin = datetime(inicio.year, inicio.month, ultimo_dia, 23, 59, 59)
-        agrupamiento = func.date(HistorialSalida.hora_salida)
-
+        fin = date(inicio.year, inicio.month, monthrange(inicio.year, inicio.month)[1])
     elif modo == "anio":
-        if inicio_str:
-            try:
-                inicio = datetime.fromisoformat(inicio_str)
-                inicio = datetime(inicio.year, inicio.month, inicio.day, 0, 0, 0)  # fuerza hora exacta
-            except Exception:
-                return jsonify({"error": "Fecha de inicio inválida"}), 400
-        else:
+        if not inicio_str:
             inicio = datetime(hoy.year, 1, 1)
-        fin = datetime(inicio.year, 12, 31)
-        agrupamiento = func.strftime("%Y-%m", HistorialSalida.hora_salida)
-
+        fin = date(inicio.year, 12, 31)
     else:
         return jsonify({"error": "Modo inválido"}), 400
 
-    resultados = (
-        db.session.query(agrupamiento.label("periodo"), func.count().label("cantidad"))
-        .filter(HistorialSalida.hora_salida >= inicio, HistorialSalida.hora_salida <= fin)
-        .group_by("periodo")
-        .order_by("periodo")
+    # Se lee del resumen por día/hora (resumen_salidas), no del historial crudo
+    por_dia = (
+        db.session.query(
+            ResumenSalida.dia,
+            func.sum(ResumenSalida.cantidad),
+            func.sum(ResumenSalida.recaudacion),
+            func.sum(ResumenSalida.minutos),
+        )
+        .filter(
+            ResumenSalida.estacionamiento_id == lote_actual(),
+            ResumenSalida.dia >= inicio.date(),
+            ResumenSalida.dia <= fin,
+        )
+        .group_by(ResumenSalida.dia)
+        .order_by(ResumenSalida.dia)
         .all()
     )
 
+    periodos = {}
+    for dia, cantidad, recaudacion, minutos in por_dia:
+        clave = dia.strftime("%Y-%m") if modo == "anio" else dia.isoformat()
+        p = periodos.setdefault(clave, [0, 0.0, 0.0])
+        p[0] += cantidad
+        p[1] += recaudacion
+        p[2] += minutos
+
     return jsonify([
-        {"periodo": r.periodo, "cantidad": r.cantidad} for r in resultados
+        {
+            "periodo": periodo,
+            "cantidad": cantidad,
+            "recaudacion": recaudacion,
+            "minutos": round(minutos, 2),
+            "promedio_minutos": round(minutos / cantidad, 2) if cantidad else 0,
+        }
+        for periodo, (cantidad, recaudacion, minutos) in periodos.items()
     ])
 
+# ---------- Estacionamientos ----------
+@app.route("/estacionamientos", methods=["GET"])
+def listar_estacionamientos():
+    filas = db.session.execute(
+        select(Estacionamiento.id, Estacionamiento.nombre).order_by(Estacionamiento.id)
+    )
+    return respuesta_json(proyectar(filas, (("id", None), ("nombre", None))))
+
+@app.route("/estacionamientos", methods=["POST"])
+def crear_estacionamiento():
+    nombre = ((request.get_json() or {}).get("nombre") or "").strip()
+    if not nombre:
+        return jsonify({"error": "Falta el nombre"}), 400
+    nuevo = Estacionamiento(nombre=nombre)
+    db.session.add(nuevo)
+    cache.invalidar("estacionamientos")
+    db.session.commit()
+    return jsonify({"id": nuevo.id, "nombre": nuevo.nombre}), 201
+
 # ---------- Usuarios ----------
 @app.route("/registro", methods=["POST"])
 def registro_usuario():
@@ -254,8 +1035,9 @@ def registro_usuario():
         correo=data["correo"],
         tipo_usuario=data["tipo_usuario"],
     )
-    user.set_password(data["contraseña"])
+    seguridad.asignar_contraseña(user, data["contraseña"])
     db.session.add(user)
+    cache.invalidar("usuarios")
     db.session.commit()
     return jsonify({"mensaje": "Usuario registrado"}), 201
 
@@ -263,32 +1045,31 @@ def registro_usuario():
 def login():
     data = request.json
     user = Usuario.query.filter_by(correo=data["correo"]).first()
-    if user and user.check_password(data["contraseña"]):
+    if user and seguridad.verificar_contraseña(user, data["contraseña"]):
         return jsonify(
             {
                 "mensaje": "Login exitoso",
                 "id": user.id,
                 "nombre": user.nombre,
                 "tipo_usuario": user.tipo_usuario,
+                "token": seguridad.emitir_token(user),
+                "expira_en": app.config["TOKEN_EXPIRA_SEGUNDOS"],
             }
         )
     return jsonify({"error": "Correo o contraseña incorrectos"}), 401
 
 # --- LISTAR ---
+CAMPOS_USUARIO = (("id", None), ("nombre", None), ("correo", None), ("tipo_usuario", None))
+
 @app.route("/usuarios", methods=["GET"])
+@con_etag("usuarios")
 def listar_usuarios():
-    usuarios = Usuario.query.all()
-    return jsonify(
-        [
-            {
-                "id": u.id,
-                "nombre": u.nombre,
-                "correo": u.correo,
-                "tipo_usuario": u.tipo_usuario,
-            }
-            for u in usuarios
-        ]
-    )
+    def leer():
+        filas = db.session.execute(
+            select(Usuario.id, Usuario.nombre, Usuario.correo, Usuario.tipo_usuario)
+        )
+        return proyectar(filas, CAMPOS_USUARIO)
+    return respuesta_json(cache.obtener("usuarios", ("usuarios",), leer))
 
 # --- OBTENER ---
 @app.route("/usuario/<int:uid>", methods=["GET"])
@@ -313,9 +1094,10 @@ def actualizar_usuario(uid):
     if not usuario:
         return jsonify({"error": "Usuario no encontrado"}), 404
 
-    if (
-        not data.get("contraseña_actual")
-        or not usuario.check_password(data["contraseña_actual"])
+    # Un token de sesión del mismo usuario reemplaza a la contraseña actual
+    sesion = seguridad.usuario_del_token()
+    if (sesion is None or sesion.id != usuario.id) and not seguridad.verificar_contraseña(
+        usuario, data.get("contraseña_actual")
     ):
         return jsonify({"error": "Contraseña actual incorrecta"}), 401
 
@@ -328,10 +1110,15 @@ def actualizar_usuario(uid):
 
     nueva = data.get("nueva_contraseña", "")
     if nueva:
-        usuario.set_password(nueva)
+        seguridad.asignar_contraseña(usuario, nueva)
 
+    cache.invalidar("usuarios")
     db.session.commit()
-    return jsonify({"mensaje": "Usuario actualizado correctamente"})
+    respuesta = {"mensaje": "Usuario actualizado correctamente"}
+    if nueva:
+        # Los tokens anteriores quedan invalidados al cambiar la contraseña
+        respuesta["token"] = seguridad.emitir_token(usuario)
+    return jsonify(respuesta)
 
 # --- ELIMINAR ---
 @app.route("/usuario/<int:uid>", methods=["DELETE"])
@@ -340,58 +1127,262 @@ def eliminar_usuario(uid):
     if not usuario:
         return jsonify({"error": "Usuario no encontrado"}), 404
     db.session.delete(usuario)
+    cache.invalidar("usuarios")
     db.session.commit()
     return jsonify({"mensaje": "Usuario eliminado"})
 
 @app.route("/plazas", methods=["GET"])
+@con_etag("plazas")
 def obtener_plazas():
-    plazas = Plaza.query.order_by(Plaza.fila, Plaza.numero).all()
-    return jsonify([
-        {
-            "codigo": p.codigo,
-            "fila": p.fila,
-            "numero": p.numero,
-            "ocupado": p.ocupado
-        } for p in plazas
-    ])
+    lote = lote_actual()
+    def leer():
+        filas = db.session.execute(
+            select(Plaza.codigo, Plaza.fila, Plaza.numero, Plaza.ocupado)
+            .where(Plaza.estacionamiento_id == lote)
+            .order_by(Plaza.fila, Plaza.numero)
+        )
+        return proyectar(
+            filas, (("codigo", None), ("fila", None), ("numero", None), ("ocupado", None))
+        )
+    return respuesta_json(cache.obtener(f"plazas:{lote}", espacios("plazas"), leer))
+
+@app.route("/plazas/layout", methods=["POST"])
+def aplicar_layout():
+    """Crea/borra plazas para que el estacionamiento quede como el layout pedido.
+
+    Body: {"filas": {"A": [1, 40], "B": {"desde": 1, "hasta": 30, "excluir": [13]}},
+           "excluir": ["A07"]}. Todo en una transacción; si alguna plaza que
+    sobra está ocupada no se aplica nada (409).
+    """
+    inicio = time.perf_counter()
+    lote = lote_actual()
+    try:
+        deseadas = distribucion.expandir(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    existentes = db.session.execute(
+        select(Plaza.id, Plaza.codigo, Plaza.fila, Plaza.numero, Plaza.ocupado)
+        .where(Plaza.estacionamiento_id == lote)
+    ).all()
+    nuevas, sobrantes, movidas = distribucion.diferencia(deseadas, existentes)
+    ocupadas = sorted(p.codigo for p in sobrantes if p.ocupado)
+    if ocupadas:
+        db.session.rollback()
+        return jsonify({"error": "Hay plazas ocupadas que se eliminarían",
+                        "ocupadas": ocupadas}), 409
+
+    try:
+        if sobrantes:
+            # ocupado == False otra vez: si alguien estacionó entre medio, no se borra
+            borradas = db.session.execute(
+                delete(Plaza)
+                .where(Plaza.id.in_([p.id for p in sobrantes]), Plaza.ocupado == False)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if borradas != len(sobrantes):
+                db.session.rollback()
+                return jsonify({"error": "Una plaza a eliminar se ocupó; reintente"}), 409
+        if movidas:
+            db.session.execute(
+                update(Plaza), [{"id": i, "fila": f, "numero": n} for i, f, n in movidas]
+            )
+        if nuevas:
+            db.session.execute(insert(Plaza), [
+                {"estacionamiento_id": lote, "codigo": c, "fila": f, "numero": n, "ocupado": False}
+                for c, f, n in nuevas
+            ])
+        if nuevas or sobrantes or movidas:
+            registrar_cambios([(c, False) for c, _, _ in nuevas])
+            if sobrantes or movidas:
+                # Plazas que desaparecen o cambian de fila: los clientes piden un snapshot nuevo
+                registrar_cambios([(eventos.RECARGAR, False)])
+            cache.invalidar(*espacios("plazas"))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "El layout cambió mientras se aplicaba; reintente"}), 409
+
+    if nuevas or sobrantes or movidas:
+        asignadores(lote).recargar()
+    duracion_ms = round((time.perf_counter() - inicio) * 1000, 1)
+    if len(deseadas) >= app.config["LAYOUT_LOG_PLAZAS"]:
+        app.logger.info(
+            "Layout estacionamiento %s: %d plazas (+%d -%d ~%d) en %s ms",
+            lote, len(deseadas), len(nuevas), len(sobrantes), len(movidas), duracion_ms,
+        )
+    return jsonify({
+        "total": len(deseadas),
+        "creadas": len(nuevas),
+        "eliminadas": len(sobrantes),
+        "actualizadas": len(movidas),
+        "duracion_ms": duracion_ms,
+    })
+
+@app.route("/plazas/stream", methods=["GET"])
+def stream_plazas():
+    """Server-Sent Events: snapshot de todas las plazas al conectar y luego
+    un evento ``plaza`` por cada cambio (codigo, ocupado), más heartbeats.
+
+    Si el layout cambia se envía ``recargar`` y se cierra el stream: el
+    EventSource se reconecta solo y recibe el snapshot nuevo."""
+    cola = difusor.suscribir(lote_actual())
+    if cola is None:
+        return jsonify({"error": "Demasiadas conexiones abiertas"}), 503
+    try:
+        ultimo = difusor.ultimo_id()
+        snapshot = [
+            {"codigo": p.codigo, "ocupado": bool(p.ocupado)}
+            for p in db.session.execute(
+                select(Plaza.codigo, Plaza.ocupado)
+                .where(Plaza.estacionamiento_id == lote_actual())
+                .order_by(Plaza.fila, Plaza.numero)
+            )
+        ]
+    except Exception:
+        difusor.desuscribir(cola)
+        raise
+    heartbeat = app.config["SSE_HEARTBEAT_SEGUNDOS"]
+
+    # Sin stream_with_context: la sesión se cierra al volver de la vista y
+    # la conexión abierta no retiene una conexión del pool de la BD.
+    def generar():
+        try:
+            yield eventos.formatear("snapshot", snapshot, ultimo)
+            while True:
+                try:
+                    ev = cola.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if ev is eventos.CERRAR:
+                    return
+                if ev.codigo == eventos.RECARGAR:
+                    yield eventos.formatear("recargar", {}, ev.id)
+                    return
+                yield eventos.formatear(
+                    "plaza", {"codigo": ev.codigo, "ocupado": ev.ocupado}, ev.id
+                )
+        finally:
+            difusor.desuscribir(cola)
+
+    return Response(
+        generar(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.route("/estadisticas", methods=["GET"])
 def estadisticas():
-    total = Plaza.query.count()
-    ocupadas = Plaza.query.filter_by(ocupado=True).count()
+    lote = lote_actual()
+    return respuesta_json(cache.obtener(
+        f"estadisticas:{lote}", espacios("plazas", "usuarios"),
+        lambda: calcular_estadisticas(lote),
+    ))
+
+def calcular_estadisticas(lote):
+    total, ocupadas = db.session.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(case((Plaza.ocupado == True, 1), else_=0)), 0),
+        ).where(Plaza.estacionamiento_id == lote)
+    ).one()
     libres = total - ocupadas
 
     ocupacion_por_fila = (
         db.session.query(Plaza.fila, db.func.count())
-        .filter(Plaza.ocupado == True)
+        .filter(Plaza.estacionamiento_id == lote, Plaza.ocupado == True)
         .group_by(Plaza.fila)
         .all()
     )
 
-    usuarios = Usuario.query.all()
     tipos = {"admin": 0, "trabajador": 0, "usuario": 0}
-    for u in usuarios:
-        if u.tipo_usuario in tipos:
-            tipos[u.tipo_usuario] += 1
+    for tipo, cantidad in db.session.execute(
+        select(Usuario.tipo_usuario, func.count()).group_by(Usuario.tipo_usuario)
+    ):
+        if tipo in tipos:
+            tipos[tipo] = cantidad
 
-    return jsonify({
+    return {
         "total_plazas": total,
         "ocupadas": ocupadas,
         "libres": libres,
         "por_fila": [{"fila": f, "cantidad": c} for f, c in ocupacion_por_fila],
         "usuarios": tipos,
-    })
+    }
+
+@app.route("/estadisticas/ocupacion", methods=["GET"])
+def estadisticas_ocupacion():
+    """Ocupación ponderada en el tiempo: por hora del día, día de la semana y fila,
+    más el pico de vehículos simultáneos. Rango: desde/hasta (ISO, por defecto
+    los últimos 30 días); ``detalle=1`` agrega la serie hora a hora."""
+    ahora = datetime.now()
+    try:
+        hasta = parsear_fecha(request.args["hasta"], fin=True) if request.args.get("hasta") else ahora
+        desde = (
+            parsear_fecha(request.args["desde"]) if request.args.get("desde")
+            else hasta - timedelta(days=30)
+        )
+    except ValueError:
+        return jsonify({"error": "Fecha inválida"}), 400
+    desde = desde.replace(minute=0, second=0, microsecond=0)
+    hasta = min(hasta, ahora)
+    if hasta <= desde:
+        return jsonify({"error": "Rango vacío"}), 400
+    detalle = request.args.get("detalle") in ("1", "true")
+
+    lote = lote_actual()
+
+    def calcular():
+        dialecto = db.engine.dialect.name
+        historial = select(
+            analitica.minutos_desde(HistorialSalida.hora_entrada, desde, dialecto),
+            analitica.minutos_desde(HistorialSalida.hora_salida, desde, dialecto),
+            func.substr(HistorialSalida.posicion, 1, 1),
+        ).where(
+            HistorialSalida.estacionamiento_id == lote,
+            HistorialSalida.hora_salida > desde,
+            HistorialSalida.hora_entrada < hasta,
+        )
+        # Los vehículos estacionados cuentan hasta ahora
+        activos = (
+            select(
+                analitica.minutos_desde(Vehiculo.hora_entrada, desde, dialecto),
+                analitica.minutos_desde(literal(ahora), desde, dialecto),
+                Plaza.fila,
+            )
+            .join(Plaza, Vehiculo.plaza_id == Plaza.id)
+            .where(Vehiculo.estacionamiento_id == lote, Vehiculo.hora_entrada < hasta)
+        )
+        # Core directo: con cientos de miles de filas el Result del ORM pesa
+        conexion = db.session.connection()
+        intervalos = conexion.execute(historial).all()
+        intervalos += conexion.execute(activos).all()
+        for segmento in archivo_salidas.segmentos(lote, desde=desde, entrada_hasta=hasta):
+            intervalos += [
+                ((f["hora_entrada"] - desde).total_seconds() / 60,
+                 (f["hora_salida"] - desde).total_seconds() / 60,
+                 (f["posicion"] or "")[:1] or None)
+                for f in archivo_salidas.filas(segmento, desde=desde)
+                if f["hora_salida"] > desde and f["hora_entrada"] < hasta
+            ]
+        plazas_por_fila = dict(
+            db.session.execute(
+                select(Plaza.fila, func.count())
+                .where(Plaza.estacionamiento_id == lote)
+                .group_by(Plaza.fila)
+            ).all()
+        )
+        return analitica.ocupacion(intervalos, desde, hasta, plazas_por_fila, detalle)
+
+    clave = f"ocupacion:{lote}:{desde.isoformat()}:{request.args.get('hasta', '')}:{detalle}"
+    return respuesta_json(cache.obtener(clave, espacios("plazas", "vehiculos"), calcular))
 
 @app.route("/configuracion", methods=["GET"])
 def obtener_config():
-    config = Configuracion.query.first()
+    config = config_actual()
     if config:
-        return jsonify({
-            "nombre": config.nombre,
-            "apertura": config.apertura,
-            "cierre": config.cierre,
-            "tarifa": config.tarifa
-        })
+        return jsonify(config)
     return jsonify({"error": "Configuración no encontrada"}), 404
 
 @app.route("/configuracion", methods=["PUT"])
@@ -404,19 +1395,27 @@ def actualizar_config():
         "nombre": datos.get("nombre"),
         "apertura": datos.get("apertura"),
         "cierre": datos.get("cierre"),
-        "tarifa": datos.get("tarifa")
+        "tarifa": datos.get("tarifa"),
+        **{campo: datos.get(campo) for campo in CAMPOS_TARIFA},
     }
+    try:
+        tarifas.compilar(datos_filtrados, app.config["TARIFA_POR_MINUTO"])
+    except (TypeError, ValueError):
+        return jsonify({"error": "Reglas de tarifa inválidas"}), 400
 
-    config = Configuracion.query.first()
+    config = Configuracion.query.filter_by(estacionamiento_id=lote_actual()).first()
     if not config:
-        config = Configuracion(**datos_filtrados)
+        config = Configuracion(estacionamiento_id=lote_actual(), **datos_filtrados)
         db.session.add(config)
     else:
         config.nombre = datos_filtrados["nombre"]
         config.apertura = datos_filtrados["apertura"]
         config.cierre = datos_filtrados["cierre"]
         config.tarifa = datos_filtrados["tarifa"]
+        for campo in CAMPOS_TARIFA:
+            setattr(config, campo, datos_filtrados[campo])
 
+    cache.invalidar(*espacios("configuracion"))
     db.session.commit()
     return jsonify({"mensaje": "Configuración actualizada correctamente"})
 
@@ -431,11 +1430,15 @@ def registrar_cuadratura():
     jornada_str = data["jornada"]          # viene como string "YYYY-MM-DD"
     desglose = data["desglose"]
     total = data["total"]
-    contraseña = data["password"]
+    contraseña = data.get("password")
 
-    trabajador = Usuario.query.get(trabajador_id)
-    if not trabajador or not trabajador.check_password(contraseña):
-        return jsonify({"error": "Contraseña incorrecta"}), 401
+    sesion = seguridad.usuario_del_token()
+    if sesion is not None and sesion.id == trabajador_id:
+        trabajador = sesion
+    else:
+        trabajador = Usuario.query.get(trabajador_id)
+        if not trabajador or not seguridad.verificar_contraseña(trabajador, contraseña):
+            return jsonify({"error": "Contraseña incorrecta"}), 401
 
     try:
         jornada_fecha = datetime.strptime(jornada_str, "%Y-%m-%d").date()
@@ -443,20 +1446,204 @@ def registrar_cuadratura():
         return jsonify({"error": "Formato de fecha inválido"}), 400
 
     nueva_cuadratura = Cuadratura(
+        estacionamiento_id=lote_actual(),
         trabajador_id=trabajador_id,
         fecha=date.today(),             # fecha del registro
-        jornada=jornada_fecha,          # fecha seleccionada como jornada
+        jornada=jornada_fecha.isoformat(),  # fecha seleccionada como jornada
         desglose=json.dumps(desglose),
         total=total
     )
     db.session.add(nueva_cuadratura)
+    cache.invalidar(*espacios("cuadraturas"))
     db.session.commit()
     return jsonify({"mensaje": "Caja base registrada con éxito"})
 
+@app.route("/cuadratura/reconciliacion", methods=["GET"])
+def reconciliar_cuadraturas():
+    """Declarado (cuadratura) vs. cobrado (historial) por trabajador y jornada.
+
+    ?jornada=YYYY-MM-DD o ?desde=&hasta= (fechas, hasta incluida). Las
+    jornadas cerradas (antes de hoy) se cachean por más tiempo.
+    """
+    try:
+        if request.args.get("jornada"):
+            desde = hasta = date.fromisoformat(request.args["jornada"])
+        else:
+            desde = date.fromisoformat(request.args["desde"])
+            hasta = date.fromisoformat(request.args.get("hasta") or date.today().isoformat())
+    except (KeyError, ValueError):
+        return jsonify({"error": "Indique jornada o desde/hasta (YYYY-MM-DD)"}), 400
+    if hasta < desde or (hasta - desde).days > app.config["CUADRATURA_MAX_DIAS"]:
+        return jsonify({"error": "Rango de jornadas inválido"}), 400
+
+    lote = lote_actual()
+    if hasta >= date.today():
+        return respuesta_json(conciliar(lote, desde, hasta))
+    return respuesta_json(cache.obtener(
+        f"reconciliacion:{lote}:{desde}:{hasta}", espacios("cuadraturas", "usuarios"),
+        lambda: conciliar(lote, desde, hasta),
+        ttl=app.config["CUADRATURA_CACHE_SEGUNDOS"],
+    ))
+
+def conciliar(lote, desde, hasta):
+    inicio = datetime.combine(desde, datetime.min.time())
+    fin = datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+    dia = analitica.dia_de(HistorialSalida.hora_salida, db.engine.dialect.name)
+
+    # Una sola agregación sobre la ventana del índice (estacionamiento_id, hora_salida)
+    cobrado = db.session.execute(
+        select(
+            dia, HistorialSalida.trabajador_id,
+            func.count(), func.coalesce(func.sum(HistorialSalida.total_pagado), 0),
+        )
+        .where(
+            HistorialSalida.estacionamiento_id == lote,
+            HistorialSalida.hora_salida >= inicio,
+            HistorialSalida.hora_salida < fin,
+        )
+        .group_by(dia, HistorialSalida.trabajador_id)
+    ).all()
+    # Si un trabajador registró varias cuadraturas para la jornada vale la última
+    declarado = {
+        (c.jornada, c.trabajador_id): c.total
+        for c in db.session.execute(
+            select(Cuadratura.jornada, Cuadratura.trabajador_id, Cuadratura.total)
+            .where(
+                Cuadratura.estacionamiento_id == lote,
+                Cuadratura.jornada >= desde.isoformat(),
+                Cuadratura.jornada <= hasta.isoformat(),
+            )
+            .order_by(Cuadratura.id)
+        )
+    }
+
+    filas = {}
+    for jornada, trabajador_id, salidas, total in cobrado:
+        filas[(str(jornada), trabajador_id)] = (salidas, float(total))
+    for segmento in archivo_salidas.segmentos(lote, desde=inicio, hasta=fin):
+        for f in archivo_salidas.filas(segmento, desde=inicio, hasta=fin):
+            if f["hora_salida"] < fin:
+                clave = (f["hora_salida"].date().isoformat(), f["trabajador_id"])
+                salidas, total = filas.get(clave, (0, 0.0))
+                filas[clave] = (salidas + 1, total + (f["total_pagado"] or 0))
+    for clave in declarado:
+        filas.setdefault(clave, (0, 0.0))
+    ids = {t for _, t in filas if t is not None}
+    nombres = dict(db.session.execute(
+        select(Usuario.id, Usuario.nombre).where(Usuario.id.in_(ids))
+    ).all()) if ids else {}
+
+    tolerancia = app.config["CUADRATURA_TOLERANCIA"]
+    resultado, totales = [], {"declarado": 0.0, "calculado": 0.0}
+    for (jornada, trabajador_id), (salidas, calculado) in sorted(
+        filas.items(), key=lambda f: (f[0][0], f[0][1] is None, f[0][1] or 0)
+    ):
+        declarado_total = declarado.get((jornada, trabajador_id))
+        if trabajador_id is None:
+            estado, diferencia = "sin_trabajador", None
+        elif declarado_total is None:
+            estado, diferencia = "sin_declarar", None
+        else:
+            diferencia = round(declarado_total - calculado, 2)
+            estado = (
+                "cuadra" if abs(diferencia) <= tolerancia
+                else "sobrante" if diferencia > 0 else "faltante"
+            )
+        totales["declarado"] += declarado_total or 0
+        totales["calculado"] += calculado
+        resultado.append({
+            "jornada": jornada,
+            "trabajador_id": trabajador_id,
+            "trabajador": nombres.get(trabajador_id),
+            "salidas": salidas,
+            "calculado": round(calculado, 2),
+            "declarado": declarado_total,
+            "diferencia": diferencia,
+            "estado": estado,
+            "discrepancia": estado != "cuadra",
+        })
+    return {
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "tolerancia": tolerancia,
+        "declarado": round(totales["declarado"], 2),
+        "calculado": round(totales["calculado"], 2),
+        "discrepancias": sum(r["discrepancia"] for r in resultado),
+        "detalle": resultado,
+    }
+
 # Bootstrap
 # ─────────────────────────────
+def preparar_base():
+    """Crea las tablas que falten y aplica las migraciones pendientes."""
+    db.create_all()
+    return migraciones.aplicar()
+
+@app.cli.command("recalcular-resumen")
+def recalcular_resumen():
+    """Reconstruye resumen_salidas a partir de historial_salida y del archivo."""
+    with db.engine.begin() as conn:
+        filas = resumen.reconstruir(conn, archivadas=archivo_salidas.resumen())
+    click.echo(f"✔️ Resumen recalculado ({filas} filas día/hora)")
+
+@app.cli.command("archivar")
+@click.option("--meses", type=int, default=None,
+              help="Meses completos que quedan en la tabla además del actual")
+def archivar(meses):
+    """Mueve las salidas de meses antiguos a segmentos comprimidos en ARCHIVO_DIR."""
+    if not archivo_salidas.directorio:
+        raise click.ClickException(
+            "Defina ARCHIVO_DIR: un directorio durable y compartido por todas las "
+            "instancias (no el disco efímero de un dyno), o las salidas se perderán"
+        )
+    meses = app.config["ARCHIVO_MESES_CALIENTES"] if meses is None else meses
+    if meses < 0:
+        raise click.BadParameter("Debe ser 0 o más", param_hint="--meses")
+    hoy = date.today()
+    total_meses = hoy.year * 12 + hoy.month - 1 - meses
+    corte = datetime(total_meses // 12, total_meses % 12 + 1, 1)
+    inicio = time.perf_counter()
+    segmentos = archivo_salidas.archivar(corte)
+    for s in segmentos:
+        click.echo(f"✔️ {s['archivo']}: {s['filas']} salidas, ${s['total']:,.0f}")
+    click.echo(
+        f"Archivado antes de {corte:%Y-%m}: {len(segmentos)} segmentos "
+        f"en {time.perf_counter() - inicio:.1f} s"
+    )
+
+def informe_base():
+    return ", ".join(f"{k}={v}" for k, v in basedatos.verificar().items())
+
+@app.cli.command("verificar-bd")
+def verificar_bd():
+    """Muestra la configuración efectiva de la base de datos."""
+    click.echo(informe_base())
+
+@app.cli.command("trabajador")
+@click.option("--una-vez", is_flag=True, help="Procesa lo pendiente y termina")
+def trabajador(una_vez):
+    """Ejecuta la cola de trabajos (recibos, webhooks) hasta que se detenga."""
+    click.echo("Trabajador iniciado")
+    try:
+        trabajos.bucle(app, una_vez=una_vez)
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command("migrar")
+def migrar():
+    """Crea tablas faltantes y aplica migraciones sin borrar datos."""
+    try:
+        aplicadas = preparar_base()
+    except migraciones.ErrorMigracion as e:
+        raise click.ClickException(str(e))
+    for version, descripcion in aplicadas:
+        click.echo(f"✔️ Migración {version}: {descripcion}")
+    click.echo(f"Esquema en versión {migraciones.version_actual(db.engine)}")
+    click.echo(informe_base())
+
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        preparar_base()
         print("✔️ Base de datos y tablas listas")
+        print("ℹ️ ", informe_base())
     app.run(debug=True)
@@ -0,0 +1,300 @@
+# archivo.py
+import gzip
+import heapq
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+
+from models import db, HistorialSalida
+
+
+# ─────────────────────────────────────────────
+#  ARCHIVO DE SALIDAS ANTIGUAS
+#  - Los meses cerrados de historial_salida pasan a un segmento
+#    gzip‑NDJSON por estacionamiento y mes, ordenado por
+#    (hora_salida, id), y se borran de la tabla
+#  - index.json guarda por segmento el rango de horas (salida y
+#    entrada) y la cantidad de filas: solo se abren los segmentos
+#    que se cruzan con el rango pedido
+#  - Cada segmento es una serie de miembros gzip de BLOQUE_FILAS filas
+#    (sigue siendo un .gz válido); el índice guarda offset y rango de
+#    cada bloque para saltar al rango o al cursor y leer hacia atrás
+#    sin descomprimir el mes entero
+#  - Todo lo archivado es anterior a lo que queda en la tabla
+#    (hora_salida siempre es la hora del cobro), así que leer
+#    "tabla + archivo" es concatenar, sin mezclar
+#  - resumen_salidas no se toca: las estadísticas agregadas siguen
+#    contando lo archivado
+# ─────────────────────────────────────────────
+COLUMNAS = tuple(c.name for c in HistorialSalida.__table__.columns)
+_FECHAS = ("hora_entrada", "hora_salida")
+BLOQUE_FILAS = 2000
+
+
+def _mes(fecha):
+    return fecha.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _mes_siguiente(mes):
+    return mes.replace(year=mes.year + 1, month=1) if mes.month == 12 else mes.replace(month=mes.month + 1)
+
+
+def _fila(linea):
+    fila = json.loads(linea)
+    for campo in _FECHAS:
+        fila[campo] = datetime.fromisoformat(fila[campo])
+    return fila
+
+
+def _escribir_atomico(ruta, escribir):
+    temporal = ruta + ".tmp"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+
+class Archivo:
+    """Segmentos de un directorio. El índice se relee si otro proceso lo cambió.
+
+    Sin directorio (ARCHIVO_DIR sin definir) no hay nada archivado y
+    archivar() se niega a borrar filas.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._indice = []
+        self._leido = None            # mtime del index.json cargado
+        self._lock = threading.Lock()
+
+    @property
+    def _ruta_indice(self):
+        return os.path.join(self.directorio, "index.json")
+
+    # ------ índice ------
+    def indice(self):
+        if not self.directorio:
+            return []
+        try:
+            mtime = os.stat(self._ruta_indice).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if mtime != self._leido:
+            with self._lock:
+                with open(self._ruta_indice, encoding="utf-8") as f:
+                    self._indice = json.load(f)["segmentos"]
+                self._leido = mtime
+        return self._indice
+
+    def _guardar_indice(self, segmentos):
+        segmentos = sorted(segmentos, key=lambda s: (s["estacionamiento_id"], s["mes"]))
+
+        def escribir(ruta):
+            with open(ruta, "w", encoding="utf-8") as f:
+                json.dump({"segmentos": segmentos}, f, ensure_ascii=False, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+
+        _escribir_atomico(self._ruta_indice, escribir)
+
+    def segmentos(self, estacionamiento_id, desde=None, hasta=None, entrada_hasta=None):
+        """Segmentos del estacionamiento cuyas salidas caen en [desde, hasta].
+
+        Con ``entrada_hasta`` se filtra por hora de entrada < entrada_hasta
+        (estadías que se cruzan con un rango, sin importar cuándo salieron).
+        """
+        elegidos = []
+        for s in self.indice():
+            if s["estacionamiento_id"] != estacionamiento_id:
+                continue
+            if desde is not None and s["hasta"] < desde.isoformat():
+                continue
+            if hasta is not None and s["desde"] > hasta.isoformat():
+                continue
+            if entrada_hasta is not None and s["entrada_desde"] >= entrada_hasta.isoformat():
+                continue
+            elegidos.append(s)
+        return sorted(elegidos, key=lambda s: s["mes"])
+
+    # ------ lectura ------
+    def _ruta(self, segmento):
+        return os.path.join(self.directorio, segmento["archivo"])
+
+    def filas(self, segmento, desde=None, hasta=None):
+        """Dicts de un segmento en orden (hora_salida, id), de a una.
+
+        Empieza en el primer bloque que llega a ``desde`` y corta al pasar
+        ``hasta``; solo se lee del disco lo que se va consumiendo.
+        """
+        bloques = segmento.get("bloques") or [[0, None, segmento["desde"], segmento["hasta"]]]
+        inicio = next(
+            (b[0] for b in bloques if desde is None or b[3] >= desde.isoformat()), None
+        )
+        if inicio is None:
+            return
+        with open(self._ruta(segmento), "rb") as crudo:
+            crudo.seek(inicio)
+            with gzip.GzipFile(fileobj=crudo) as f:
+                for linea in f:
+                    fila = _fila(linea)
+                    if hasta is not None and fila["hora_salida"] > hasta:
+                        return
+                    if desde is None or fila["hora_salida"] >= desde:
+                        yield fila
+
+    def filas_descendentes(self, segmento, desde=None, hasta=None):
+        """Dicts de un segmento en orden (hora_salida, id) descendente.
+
+        Lee un bloque por vez desde el final: la memoria queda acotada a
+        BLOQUE_FILAS líneas y los bloques posteriores a ``hasta`` no se abren.
+        """
+        bloques = segmento.get("bloques") or [[0, None, segmento["desde"], segmento["hasta"]]]
+        with open(self._ruta(segmento), "rb") as crudo:
+            for offset, largo, primera, ultima in reversed(bloques):
+                if hasta is not None and primera > hasta.isoformat():
+                    continue
+                if desde is not None and ultima < desde.isoformat():
+                    return
+                crudo.seek(offset)
+                lineas = gzip.decompress(crudo.read(-1 if largo is None else largo)).splitlines()
+                for linea in reversed(lineas):
+                    fila = _fila(linea)
+                    if hasta is not None and fila["hora_salida"] > hasta:
+                        continue
+                    if desde is not None and fila["hora_salida"] < desde:
+                        return
+                    yield fila
+
+    def salidas(self, estacionamiento_id, campos, desde=None, hasta=None, patente=None,
+                descendente=False, antes_de=None):
+        """Tuplas con nombre (``campos``) de las salidas archivadas que cumplen
+        los filtros, de a una. ``antes_de``: cursor (hora_salida, id) exclusivo
+        para recorrer en orden descendente."""
+        Fila = namedtuple("Fila", campos)
+        if antes_de is not None:
+            hasta = min(hasta or antes_de[0], antes_de[0])
+        segmentos = self.segmentos(estacionamiento_id, desde, hasta)
+        for segmento in reversed(segmentos) if descendente else segmentos:
+            leer = self.filas_descendentes if descendente else self.filas
+            for f in leer(segmento, desde, hasta):
+                if patente is not None and f["patente"] != patente:
+                    continue
+                if antes_de is not None and (f["hora_salida"], f["id"]) >= antes_de:
+                    continue
+                yield Fila(*(f[c] for c in campos))
+
+    # ------ escritura ------
+    def archivar(self, antes_de, lote=5000):
+        """Mueve al archivo las salidas con hora_salida < mes de ``antes_de``.
+
+        Un mes a la vez y por estacionamiento: escribe el segmento, actualiza
+        el índice y recién entonces borra las filas (commit por mes). Si se
+        corta a mitad, la próxima vez fusiona por id con lo ya archivado.
+        """
+        if not self.directorio:
+            raise ValueError("Archivo sin directorio: defina ARCHIVO_DIR")
+        corte = _mes(antes_de)
+        os.makedirs(self.directorio, exist_ok=True)
+        pendientes = db.session.execute(
+            select(HistorialSalida.estacionamiento_id, func.min(HistorialSalida.hora_salida))
+            .where(HistorialSalida.hora_salida < corte)
+            .group_by(HistorialSalida.estacionamiento_id)
+        ).all()
+        resultado = []
+        for estacionamiento_id, primera in pendientes:
+            mes = _mes(primera)
+            while mes < corte:
+                siguiente = _mes_siguiente(mes)
+                hecho = self._archivar_mes(estacionamiento_id, mes, siguiente, lote)
+                if hecho:
+                    resultado.append(hecho)
+                mes = siguiente
+        return resultado
+
+    def _archivar_mes(self, estacionamiento_id, mes, siguiente, lote):
+        ventana = (
+            HistorialSalida.estacionamiento_id == estacionamiento_id,
+            HistorialSalida.hora_salida >= mes,
+            HistorialSalida.hora_salida < siguiente,
+        )
+        cantidad, ultimo = db.session.execute(
+            select(func.count(), func.max(HistorialSalida.id)).where(*ventana)
+        ).one()
+        if not cantidad:
+            db.session.rollback()
+            return None
+        # Solo hasta el último id contado: lo que llegue después queda para la próxima vez
+        ventana += (HistorialSalida.id <= ultimo,)
+        de_tabla = (
+            dict(f._mapping) for f in db.session.execute(
+                select(*HistorialSalida.__table__.columns)
+                .where(*ventana)
+                .order_by(HistorialSalida.hora_salida, HistorialSalida.id)
+                .execution_options(yield_per=lote)
+            )
+        )
+        nombre = f"salidas-{estacionamiento_id}-{mes:%Y-%m}.ndjson.gz"
+        previo = next((s for s in self.indice() if s["archivo"] == nombre), None)
+        # Ambas fuentes vienen ordenadas; una fila repetida (corte a mitad) sale dos veces seguidas
+        filas = heapq.merge(
+            de_tabla, *([self.filas(previo)] if previo else []),
+            key=lambda f: (f["hora_salida"], f["id"]),
+        )
+        segmento = {"archivo": nombre, "estacionamiento_id": estacionamiento_id,
+                    "mes": f"{mes:%Y-%m}", "filas": 0, "total": 0.0}
+
+        def escribir(ruta):
+            anterior, pendientes, bloques = None, [], []
+
+            def cerrar_bloque(f):
+                datos = gzip.compress("".join(pendientes).encode(), compresslevel=6)
+                bloques.append([f.tell(), len(datos), primera, segmento["hasta"]])
+                f.write(datos)
+                pendientes.clear()
+
+            with open(ruta, "wb") as f:
+                for fila in filas:
+                    if fila["id"] == anterior:
+                        continue
+                    anterior = fila["id"]
+                    if not segmento["filas"]:
+                        segmento["desde"] = fila["hora_salida"].isoformat()
+                        segmento["entrada_desde"] = fila["hora_entrada"].isoformat()
+                    if not pendientes:
+                        primera = fila["hora_salida"].isoformat()
+                    segmento["hasta"] = fila["hora_salida"].isoformat()
+                    segmento["entrada_desde"] = min(
+                        segmento["entrada_desde"], fila["hora_entrada"].isoformat()
+                    )
+                    segmento["filas"] += 1
+                    segmento["total"] += fila["total_pagado"] or 0
+                    pendientes.append(json.dumps(
+                        {c: fila[c].isoformat() if c in _FECHAS else fila[c] for c in COLUMNAS},
+                        ensure_ascii=False,
+                    ) + "\n")
+                    if len(pendientes) >= BLOQUE_FILAS:
+                        cerrar_bloque(f)
+                if pendientes:
+                    cerrar_bloque(f)
+                f.flush()
+                os.fsync(f.fileno())
+            segmento["bloques"] = bloques
+
+        _escribir_atomico(os.path.join(self.directorio, nombre), escribir)
+        segmento["total"] = round(segmento["total"], 2)
+        self._guardar_indice(
+            [s for s in self.indice() if s["archivo"] != nombre] + [segmento]
+        )
+        db.session.execute(delete(HistorialSalida).where(*ventana))
+        db.session.commit()
+        return segmento
+
+    def resumen(self):
+        """(estacionamiento_id, hora_salida, total_pagado, duracion_minutos) de
+        todo lo archivado, para reconstruir resumen_salidas."""
+        for segmento in self.indice():
+            for f in self.filas(segmento):
+                yield (segmento["estacionamiento_id"], f["hora_salida"],
+                       f["total_pagado"], f["duracion_minutos"])
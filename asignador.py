@@ -0,0 +1,146 @@
+# asignador.py
+import heapq
+import threading
+import time
+
+from sqlalchemy import update
+
+from models import db, Plaza
+
+
+# ─────────────────────────────────────────────
+#  ASIGNADOR DE PLAZAS LIBRES
+#  - Heap en memoria ordenado por (fila, numero)
+#  - Uno por estacionamiento (AsignadoresPorLote)
+#  - Se carga una vez desde la tabla plazas
+#  - Se actualiza en cada ingreso / salida
+#  - Se reconstruye desde la BD si detecta desfase
+#  - reclamar() marca la plaza con un UPDATE condicional
+# ─────────────────────────────────────────────
+class AsignadorPlazas:
+    """Mantiene las plazas libres de este proceso en un heap (fila, numero, id).
+
+    Cada worker de gunicorn tiene su propia copia, así que el heap puede
+    quedar desfasado respecto de la BD; ``reclamar()`` confirma cada
+    candidato contra la BD y descarta los que otro worker ya tomó.
+    """
+
+    def __init__(self, estacionamiento_id=1, refresco_segundos=30, max_conflictos=8):
+        self.estacionamiento_id = estacionamiento_id
+        self.refresco_segundos = refresco_segundos
+        self.max_conflictos = max_conflictos
+        self._heap = []
+        self._libres = set()          # ids vigentes dentro del heap
+        self._cargado_en = None
+        self._lock = threading.Lock()
+
+    # ------ carga ------
+    def recargar(self):
+        """Reconstruye el heap con las plazas libres según la BD."""
+        filas = (
+            db.session.query(Plaza.fila, Plaza.numero, Plaza.id)
+            .filter(
+                Plaza.estacionamiento_id == self.estacionamiento_id,
+                Plaza.ocupado == False,
+            )
+            .all()
+        )
+        heap = [(f.fila, f.numero, f.id) for f in filas]
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+            self._libres = {id_ for _, _, id_ in heap}
+            self._cargado_en = time.monotonic()
+
+    def _vencido(self):
+        return (
+            self._cargado_en is None
+            or time.monotonic() - self._cargado_en > self.refresco_segundos
+        )
+
+    # ------ operaciones ------
+    def _sacar(self, cantidad):
+        ids = []
+        with self._lock:
+            while self._heap and len(ids) < cantidad:
+                _, _, id_ = heapq.heappop(self._heap)
+                if id_ in self._libres:
+                    self._libres.discard(id_)
+                    ids.append(id_)
+        return ids
+
+    def tomar(self, cantidad=1):
+        """Saca hasta ``cantidad`` plazas libres del heap y devuelve sus ids."""
+        recien_cargado = self._vencido()
+        if recien_cargado:
+            self.recargar()
+        ids = self._sacar(cantidad)
+        if len(ids) < cantidad and not recien_cargado:
+            # Puede que otro worker haya liberado plazas que aún no vemos
+            self.recargar()
+            with self._lock:
+                # Los ya sacados siguen libres en la BD: el heap nuevo no debe repetirlos
+                self._libres.difference_update(ids)
+            ids += self._sacar(cantidad - len(ids))
+        return ids
+
+    def reclamar(self, cantidad=1):
+        """Marca como ocupadas las siguientes plazas libres y las devuelve.
+
+        La lectura y la escritura son un solo ``UPDATE ... WHERE ocupado =
+        false RETURNING``, así que dos workers nunca se quedan con la misma
+        plaza. Los candidatos que no se actualizan ya los tomó otro worker:
+        se piden más al heap y, tras varios conflictos seguidos, se recarga.
+        Devuelve menos de ``cantidad`` plazas si el estacionamiento se llena.
+        """
+        reclamadas = []
+        conflictos = 0
+        while len(reclamadas) < cantidad:
+            candidatos = self.tomar(cantidad - len(reclamadas))
+            if not candidatos:
+                break
+            plazas = db.session.scalars(
+                update(Plaza)
+                .where(Plaza.id.in_(candidatos), Plaza.ocupado == False)
+                .values(ocupado=True)
+                .returning(Plaza)
+                .execution_options(populate_existing=True)
+            ).all()
+            reclamadas += plazas
+            if len(plazas) < len(candidatos):
+                conflictos += 1
+                if conflictos >= self.max_conflictos:
+                    self.recargar()
+                    conflictos = 0
+        return sorted(reclamadas, key=lambda p: (p.fila, p.numero))
+
+    def liberar(self, plaza_id, fila, numero):
+        """Devuelve una plaza al heap (salida de vehículo o rollback)."""
+        with self._lock:
+            if self._cargado_en is None or plaza_id in self._libres:
+                return
+            self._libres.add(plaza_id)
+            heapq.heappush(self._heap, (fila, numero, plaza_id))
+
+
+class AsignadoresPorLote:
+    """Un AsignadorPlazas por estacionamiento, creado al primer uso."""
+
+    def __init__(self, refresco_segundos=30):
+        self.refresco_segundos = refresco_segundos
+        self._asignadores = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, estacionamiento_id):
+        asignador = self._asignadores.get(estacionamiento_id)
+        if asignador is None:
+            with self._lock:
+                asignador = self._asignadores.setdefault(
+                    estacionamiento_id,
+                    AsignadorPlazas(estacionamiento_id, self.refresco_segundos),
+                )
+        return asignador
+
+    def recargar_todos(self):
+        for asignador in list(self._asignadores.values()):
+            asignador.recargar()
@@ -0,0 +1,98 @@
+# basedatos.py
+import os
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+
+from models import db
+
+
+# ─────────────────────────────────────────────
+#  BACKEND DE BASE DE DATOS
+#  - URL desde DATABASE_URL (SQLite por defecto); solo SQLite o
+#    PostgreSQL: el resumen y las versiones de caché usan sus upserts
+#  - SQLite: WAL, synchronous=NORMAL, busy_timeout y mmap por conexión
+#  - PostgreSQL: pool dimensionado, pre-ping y statement_timeout
+#  - verificar() informa la configuración efectiva
+# ─────────────────────────────────────────────
+def _entero(nombre, defecto):
+    return int(os.getenv(nombre, defecto))
+
+
+def configurar(app, base_dir):
+    """Deja listos SQLALCHEMY_DATABASE_URI y SQLALCHEMY_ENGINE_OPTIONS (antes de init_app)."""
+    url = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(base_dir, 'database.db')}")
+    if url.startswith("postgres://"):
+        # Heroku entrega postgres://, que SQLAlchemy 2 ya no acepta
+        url = "postgresql://" + url[len("postgres://"):]
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+
+    app.config["DB_SQLITE_BUSY_TIMEOUT_MS"] = _entero("DB_SQLITE_BUSY_TIMEOUT_MS", 5000)
+    app.config["DB_SQLITE_SYNCHRONOUS"] = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL")
+    app.config["DB_SQLITE_MMAP_BYTES"] = _entero("DB_SQLITE_MMAP_BYTES", 256 * 1024 * 1024)
+    app.config["DB_STATEMENT_TIMEOUT_MS"] = _entero("DB_STATEMENT_TIMEOUT_MS", 15000)
+
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        opciones = {
+            "connect_args": {"timeout": app.config["DB_SQLITE_BUSY_TIMEOUT_MS"] / 1000},
+        }
+    elif backend == "postgresql":
+        opciones = {
+            "pool_size": _entero("DB_POOL_SIZE", 5),
+            "max_overflow": _entero("DB_MAX_OVERFLOW", 10),
+            "pool_timeout": _entero("DB_POOL_TIMEOUT", 30),
+            "pool_recycle": _entero("DB_POOL_RECYCLE", 1800),
+            "pool_pre_ping": True,
+            "connect_args": {
+                "options": f"-c statement_timeout={app.config['DB_STATEMENT_TIMEOUT_MS']}",
+            },
+        }
+    else:
+        raise RuntimeError(
+            f"DATABASE_URL: backend '{backend}' no soportado (use sqlite o postgresql)"
+        )
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = opciones
+
+
+def init_app(app):
+    """Aplica los PRAGMA de SQLite a cada conexión nueva (después de db.init_app)."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+
+    pragmas = (
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={app.config['DB_SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={app.config['DB_SQLITE_BUSY_TIMEOUT_MS']}",
+        f"PRAGMA mmap_size={app.config['DB_SQLITE_MMAP_BYTES']}",
+    )
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(conexion, _registro):
+        cursor = conexion.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def verificar():
+    """Consulta la BD y devuelve la configuración efectiva (para el arranque / CLI)."""
+    engine = db.engine
+    informe = {
+        "backend": engine.dialect.name,
+        "url": engine.url.render_as_string(hide_password=True),
+        "pool": type(engine.pool).__name__,
+    }
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size"):
+                informe[pragma] = conn.execute(text(f"PRAGMA {pragma}")).scalar()
+            informe["sqlite_version"] = conn.execute(text("select sqlite_version()")).scalar()
+        elif engine.dialect.name == "postgresql":
+            informe["statement_timeout"] = conn.execute(text("SHOW statement_timeout")).scalar()
+            informe["server_version"] = conn.execute(text("SHOW server_version")).scalar()
+            informe["pool_size"] = engine.pool.size()
+            informe["max_overflow"] = engine.pool._max_overflow
+    return informe
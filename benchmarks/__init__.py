@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+import os
+
+# La app exige SECRET_KEY fuera de modo debug; las mediciones usan una fija
+os.environ.setdefault("SECRET_KEY", "benchmarks")
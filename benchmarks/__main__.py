@@ -0,0 +1,166 @@
+# benchmarks/__main__.py
+"""Suite de carga reproducible de MiEstaciona.
+
+Uso (desde la raíz del repo):
+
+    python -m benchmarks --salida resultados.json
+    python -m benchmarks --escenarios rush_ingresos,polling_dashboard --plazas 3000
+    python -m benchmarks --url http://127.0.0.1:8000      # contra gunicorn
+    python -m benchmarks --comparar base.json --tolerancia 0.2
+
+En proceso usa una BD SQLite temporal salvo que se defina DATABASE_URL.
+Con ``--url`` los datos se generan en DATABASE_URL, que debe ser la misma
+BD del servidor (o se omiten con ``--sin-datos``). Con ``--comparar``
+termina con código 1 si algún escenario empeora más que la tolerancia.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, round(p / 100 * len(valores) + 0.5) - 1))
+    return valores[indice]
+
+
+def resumir(mediciones, duracion):
+    """mediciones: lista de (peticion, segundos, estado)."""
+    tiempos = sorted(t for _, t, _ in mediciones)
+    por_estado = defaultdict(int)
+    por_peticion = defaultdict(list)
+    for nombre, t, estado in mediciones:
+        por_estado[str(estado)] += 1
+        por_peticion[nombre].append(t)
+
+    def ms(v):
+        return round(v * 1000, 2) if v is not None else None
+
+    return {
+        "peticiones": len(mediciones),
+        "errores": sum(n for e, n in por_estado.items() if int(e) >= 500),
+        "estados": dict(por_estado),
+        "duracion_s": round(duracion, 3),
+        "rps": round(len(mediciones) / duracion, 1) if duracion else None,
+        "p50_ms": ms(percentil(tiempos, 50)),
+        "p95_ms": ms(percentil(tiempos, 95)),
+        "p99_ms": ms(percentil(tiempos, 99)),
+        "por_peticion": {
+            nombre: {"n": len(ts), "p50_ms": ms(percentil(sorted(ts), 50)),
+                     "p95_ms": ms(percentil(sorted(ts), 95))}
+            for nombre, ts in sorted(por_peticion.items())
+        },
+    }
+
+
+def comparar(actual, base, tolerancia):
+    """Lista de regresiones de p95 o rps respecto de un resultado guardado."""
+    regresiones = []
+    for nombre, r in actual["escenarios"].items():
+        b = base.get("escenarios", {}).get(nombre)
+        if not b:
+            continue
+        if b.get("p95_ms") and r["p95_ms"] > b["p95_ms"] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: p95 {b['p95_ms']} → {r['p95_ms']} ms")
+        if b.get("rps") and r["rps"] < b["rps"] * (1 - tolerancia):
+            regresiones.append(f"{nombre}: rps {b['rps']} → {r['rps']}")
+        if r["errores"] > b.get("errores", 0):
+            regresiones.append(f"{nombre}: errores {b.get('errores', 0)} → {r['errores']}")
+    return regresiones
+
+
+def main(argv=None):
+    from .escenarios import ESCENARIOS
+
+    parser = argparse.ArgumentParser(description="Suite de carga de MiEstaciona")
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS))
+    parser.add_argument("--plazas", type=int, default=500)
+    parser.add_argument("--filas", type=int, default=10)
+    parser.add_argument("--historial", type=int, default=20000)
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--ocupacion", type=float, default=0.5)
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--peticiones", type=int, default=200, help="por escenario")
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--url", help="servidor ya levantado (ej. gunicorn)")
+    parser.add_argument("--sin-datos", action="store_true", help="no regenerar datos")
+    parser.add_argument("--salida", help="archivo JSON de resultados")
+    parser.add_argument("--comparar", help="resultado base para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    nombres = [e for e in args.escenarios.split(",") if e]
+    desconocidos = [e for e in nombres if e not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"escenarios desconocidos: {', '.join(desconocidos)}")
+
+    if not os.getenv("DATABASE_URL"):
+        if args.url and not args.sin_datos:
+            parser.error("con --url hay que definir DATABASE_URL o usar --sin-datos")
+        carpeta = tempfile.mkdtemp(prefix="bench_")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(carpeta, 'bench.db')}"
+
+    from app import app, asignadores, cache, preparar_base
+    from .datos import generar
+    from .escenarios import ClienteEnProceso, ClienteHTTP
+
+    datos = None
+    if not args.sin_datos:
+        with app.app_context():
+            preparar_base()
+        inicio = time.perf_counter()
+        datos = generar(
+            app, plazas=args.plazas, filas=args.filas, historial=args.historial,
+            usuarios=args.usuarios, ocupacion=args.ocupacion, semilla=args.semilla,
+        )
+        datos["generacion_s"] = round(time.perf_counter() - inicio, 2)
+        cache.limpiar()
+        with app.app_context():
+            asignadores.recargar_todos()
+
+    cliente = ClienteHTTP(args.url) if args.url else ClienteEnProceso(app)
+    cfg = {
+        "peticiones": args.peticiones,
+        "hilos": args.hilos,
+        "usuarios": args.usuarios,
+        "corrida": datetime.now().strftime("%H%M%S")[-3:],
+    }
+
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "modo": "http" if args.url else "en_proceso",
+        "python": platform.python_version(),
+        "datos": datos,
+        "parametros": {"peticiones": args.peticiones, "hilos": args.hilos},
+        "escenarios": {},
+    }
+    for nombre in nombres:
+        inicio = time.perf_counter()
+        mediciones = ESCENARIOS[nombre](cliente, cfg)
+        resultados["escenarios"][nombre] = resumir(mediciones, time.perf_counter() - inicio)
+
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar) as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        resultados["regresiones"] = regresiones
+        codigo = 1 if regresiones else 0
+
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            f.write(texto + "\n")
+    print(texto)
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# benchmarks/concurrencia_ingresos.py
+"""Dispara N ingresos en paralelo y verifica que ninguna plaza se asigne dos veces.
+
+Uso (desde la raíz del repo):
+
+    python -m benchmarks.concurrencia_ingresos --plazas 200 --ingresos 250
+    python -m benchmarks.concurrencia_ingresos --url http://127.0.0.1:8000
+
+Sin ``--url`` levanta varios procesos con la app en memoria contra una BD
+SQLite temporal (uno por "worker" de gunicorn). Con ``--url`` ataca un
+servidor ya corriendo; en ese caso la BD debe estar preparada de antemano.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def _cuerpo(patente):
+    return {
+        "patente": patente,
+        "conductor": "bench",
+        "hora_entrada": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+# ─────────────────────────────
+# Modo en proceso
+# ─────────────────────────────
+def _preparar_bd(url, plazas):
+    os.environ["DATABASE_URL"] = url
+    from app import app, preparar_base
+    from models import db, Plaza
+
+    with app.app_context():
+        preparar_base()
+        filas = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+        por_fila = -(-plazas // len(filas))
+        db.session.add_all(
+            Plaza(
+                codigo=f"{filas[i // por_fila]}{i % por_fila + 1:02d}",
+                fila=filas[i // por_fila],
+                numero=i % por_fila + 1,
+                ocupado=False,
+            )
+            for i in range(plazas)
+        )
+        db.session.commit()
+
+
+def _worker(url, patentes, hilos):
+    os.environ["DATABASE_URL"] = url
+    from app import app
+
+    def ingresar(patente):
+        with app.test_client() as cliente:
+            r = cliente.post("/registrar_vehiculo", json=_cuerpo(patente))
+            return patente, r.status_code, (r.get_json() or {}).get("numero_estacionamiento")
+
+    with ThreadPoolExecutor(hilos) as pool:
+        return list(pool.map(ingresar, patentes))
+
+
+def _en_proceso(args):
+    carpeta = tempfile.mkdtemp(prefix="bench_ingresos_")
+    url = f"sqlite:///{os.path.join(carpeta, 'bench.db')}"
+    _preparar_bd(url, args.plazas)
+
+    patentes = [f"BN{i:05d}" for i in range(args.ingresos)]
+    lotes = [patentes[i::args.procesos] for i in range(args.procesos)]
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.procesos) as pool:
+        # Se importa la app en cada proceso antes de medir
+        pool.map(_calentar, [url] * args.procesos)
+        inicio = time.perf_counter()
+        resultados = pool.starmap(_worker, [(url, l, args.hilos) for l in lotes])
+        duracion = time.perf_counter() - inicio
+
+    from app import app
+    from models import db, Plaza, Vehiculo
+
+    with app.app_context():
+        en_bd = {
+            "vehiculos": Vehiculo.query.count(),
+            "plazas_distintas": db.session.query(Vehiculo.plaza_id).distinct().count(),
+            "plazas_ocupadas": Plaza.query.filter_by(ocupado=True).count(),
+        }
+    return [r for lote in resultados for r in lote], duracion, en_bd
+
+
+def _calentar(url):
+    os.environ["DATABASE_URL"] = url
+    import app  # noqa: F401
+
+
+# ─────────────────────────────
+# Modo HTTP
+# ─────────────────────────────
+def _contra_servidor(args):
+    def ingresar(patente):
+        req = urllib.request.Request(
+            f"{args.url}/registrar_vehiculo",
+            data=json.dumps(_cuerpo(patente)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(req) as r:
+                return patente, r.status, json.load(r).get("numero_estacionamiento")
+        except urllib.error.HTTPError as e:
+            return patente, e.code, None
+
+    patentes = [f"BN{i:05d}" for i in range(args.ingresos)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(args.procesos * args.hilos) as pool:
+        resultados = list(pool.map(ingresar, patentes))
+    duracion = time.perf_counter() - inicio
+
+    with urllib.request.urlopen(f"{args.url}/historial") as r:
+        activos = json.load(r)
+    posiciones = [v["posicion"] for v in activos]
+    en_bd = {
+        "vehiculos": len(activos),
+        "plazas_distintas": len(set(posiciones)),
+    }
+    return resultados, duracion, en_bd
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plazas", type=int, default=200)
+    parser.add_argument("--ingresos", type=int, default=250)
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--url", help="servidor ya levantado (ej. gunicorn)")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        resultados, duracion, en_bd = _contra_servidor(args)
+    else:
+        resultados, duracion, en_bd = _en_proceso(args)
+
+    estados = Counter(codigo for _, codigo, _ in resultados)
+    asignadas = [plaza for _, codigo, plaza in resultados if codigo == 201]
+    repetidas = {p: n for p, n in Counter(asignadas).items() if n > 1}
+    ok = (
+        not repetidas
+        and en_bd["vehiculos"] == en_bd["plazas_distintas"]
+        and en_bd.get("plazas_ocupadas", en_bd["vehiculos"]) == en_bd["vehiculos"]
+    )
+
+    print(json.dumps({
+        "ingresos": len(resultados),
+        "estados": dict(estados),
+        "asignadas": len(asignadas),
+        "dobles_asignaciones": repetidas,
+        "bd": en_bd,
+        "segundos": round(duracion, 3),
+        "ingresos_por_segundo": round(len(resultados) / duracion, 1),
+        "ok": ok,
+    }, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# benchmarks/consultas_por_ruta.py
+"""Verifica que los listados emitan la misma cantidad de SQL con pocas o muchas filas.
+
+Uso (desde la raíz del repo):
+
+    python -m benchmarks.consultas_por_ruta --filas 20 --factor 10
+
+Carga una BD SQLite temporal con N filas, mide las sentencias de cada ruta
+(listener before_cursor_execute, con el cuerpo leído entero), la vuelve a cargar con N × factor filas y compara.
+Termina con código 1 si alguna ruta crece con el tamaño de las tablas (N+1).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+RUTAS = ("/historial", "/salidas", "/salidas?limite=50", "/salidas/export?formato=csv",
+         "/usuarios", "/plazas", "/estadisticas", "/buscar?q=V0001")
+
+
+def cargar(app, n):
+    from models import db, Plaza, Vehiculo, Usuario, HistorialSalida
+
+    with app.app_context():
+        for modelo in (Vehiculo, HistorialSalida, Plaza, Usuario):
+            db.session.query(modelo).delete()
+        plazas = [
+            Plaza(codigo=f"A{i:03d}", fila="A", numero=i, ocupado=i % 2 == 0)
+            for i in range(1, n + 1)
+        ]
+        db.session.add_all(plazas)
+        db.session.flush()
+        ahora = datetime.now()
+        db.session.add_all(
+            Vehiculo(patente=f"V{p.numero:05d}", conductor="c", hora_entrada=ahora, plaza_id=p.id)
+            for p in plazas if p.ocupado
+        )
+        db.session.add_all(
+            Usuario(nombre=f"u{i}", correo=f"u{i}@x.cl", contraseña_hash="x",
+                    tipo_usuario=("admin", "trabajador", "usuario")[i % 3])
+            for i in range(n)
+        )
+        db.session.add_all(
+            HistorialSalida(patente=f"H{i:05d}", conductor="c", hora_entrada=ahora,
+                            hora_salida=ahora + timedelta(minutes=i), duracion_minutos=i,
+                            total_pagado=i, posicion="A001")
+            for i in range(n)
+        )
+        db.session.commit()
+
+
+def consultas(app, cliente, ruta):
+    """Sentencias que ejecuta la ruta hasta terminar de leer el cuerpo.
+
+    Se cuentan con un listener propio y no con Server-Timing: ese header se
+    arma en after_request, antes de que corra el generador de las rutas en stream.
+    """
+    from models import db
+
+    contador = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        contador.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        cliente.get(ruta).get_data()
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+    return len(contador)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=20)
+    parser.add_argument("--factor", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    carpeta = tempfile.mkdtemp(prefix="bench_consultas_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(carpeta, 'bench.db')}"
+    os.environ["CACHE_TTL_SEGUNDOS"] = "0"
+    os.environ["BUSQUEDA_REFRESCO_SEGUNDOS"] = "0"
+    from app import app, cache, preparar_base
+
+    with app.app_context():
+        preparar_base()
+
+    resultado = {}
+    for n in (args.filas, args.filas * args.factor):
+        cargar(app, n)
+        cache.limpiar()
+        with app.test_client() as cliente:
+            # Primera pasada descartada: carga índices en memoria (/buscar)
+            for ruta in RUTAS:
+                consultas(app, cliente, ruta)
+            resultado[n] = {ruta: consultas(app, cliente, ruta) for ruta in RUTAS}
+
+    pocas, muchas = (resultado[n] for n in sorted(resultado))
+    crecen = {r: (pocas[r], muchas[r]) for r in RUTAS if pocas[r] != muchas[r]}
+    print(json.dumps({"consultas": resultado, "crecen": crecen, "ok": not crecen}, indent=2))
+    return 0 if not crecen else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# benchmarks/datos.py
+"""Generador de datos sintéticos de un estacionamiento.
+
+Inserta en bloque (sin objetos ORM) plazas repartidas en filas, vehículos
+estacionados, historial de salidas y usuarios. Con la misma semilla dos
+corridas generan los mismos datos (con fechas relativas a la hora actual).
+"""
+import random
+import string
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, update
+from werkzeug.security import generate_password_hash
+
+CONTRASEÑA = "bench"        # la misma para todos los usuarios generados
+LOTE = 5000
+
+
+def _lotes(filas):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= LOTE:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def patente(rng):
+    return "".join(rng.choices(string.ascii_uppercase, k=4)) + "".join(
+        rng.choices(string.digits, k=2)
+    )
+
+
+def generar(app, plazas=500, filas=10, historial=20000, usuarios=50,
+            ocupacion=0.5, dias=365, semilla=1234):
+    """Reemplaza el contenido de las tablas con datos sintéticos."""
+    from models import (
+        db, Plaza, Vehiculo, Usuario, HistorialSalida, Configuracion, VersionCache
+    )
+    import resumen
+
+    rng = random.Random(semilla)
+    letras = string.ascii_uppercase[:filas]
+    por_fila = -(-plazas // filas)
+    ahora = datetime.now().replace(microsecond=0)
+
+    with app.app_context():
+        for modelo in (Vehiculo, HistorialSalida, Plaza, Usuario, Configuracion):
+            db.session.execute(delete(modelo))
+        db.session.execute(insert(Configuracion), [
+            {"nombre": "Bench", "apertura": "07:00", "cierre": "23:00", "tarifa": 50.0}
+        ])
+
+        plazas_filas = [
+            {"id": i + 1, "codigo": f"{letras[i // por_fila]}{i % por_fila + 1:02d}",
+             "fila": letras[i // por_fila], "numero": i % por_fila + 1,
+             "ocupado": i < plazas * ocupacion}
+            for i in range(plazas)
+        ]
+        db.session.execute(insert(Plaza), plazas_filas)
+        estacionados = [
+            {"patente": f"BQ{p['id']:05d}", "conductor": f"conductor{p['id']}",
+             "hora_entrada": ahora - timedelta(minutes=rng.randint(5, 600)),
+             "plaza_id": p["id"]}
+            for p in plazas_filas if p["ocupado"]
+        ]
+        if estacionados:
+            db.session.execute(insert(Vehiculo), estacionados)
+
+        def salidas():
+            for _ in range(historial):
+                salida = ahora - timedelta(minutes=rng.randint(1, dias * 24 * 60))
+                minutos = rng.randint(5, 12 * 60)
+                p = plazas_filas[rng.randrange(plazas)]
+                yield {
+                    "patente": patente(rng), "conductor": "historico", "correo": None,
+                    "hora_entrada": salida - timedelta(minutes=minutos),
+                    "hora_salida": salida, "duracion_minutos": float(minutos),
+                    "total_pagado": float(minutos * 50), "posicion": p["codigo"],
+                }
+
+        for lote in _lotes(salidas()):
+            db.session.execute(insert(HistorialSalida), lote)
+
+        hash_ = generate_password_hash(CONTRASEÑA)
+        tipos = ("usuario", "trabajador", "admin")
+        db.session.execute(insert(Usuario), [
+            {"nombre": f"bench{i}", "correo": f"bench{i}@example.com",
+             "contraseña_hash": hash_, "tipo_usuario": tipos[i % 3]}
+            for i in range(usuarios)
+        ])
+        # Los workers que ya estén corriendo deben descartar sus cachés
+        db.session.execute(update(VersionCache).values(version=VersionCache.version + 1))
+        db.session.commit()
+
+        with db.engine.begin() as conn:
+            resumen.reconstruir(conn)
+
+    return {
+        "plazas": plazas, "filas": filas, "historial": historial,
+        "usuarios": usuarios, "ocupacion": ocupacion, "semilla": semilla,
+    }
@@ -0,0 +1,131 @@
+# benchmarks/escenarios.py
+"""Escenarios de carga: cada uno dispara peticiones y devuelve sus mediciones.
+
+Un escenario recibe un cliente (en proceso o HTTP) y los parámetros de la
+corrida, y devuelve una lista de (peticion, segundos, estado).
+"""
+import itertools
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .datos import CONTRASEÑA
+
+
+# ─────────────────────────────
+# Clientes
+# ─────────────────────────────
+class ClienteEnProceso:
+    """Usa el test client de Flask; uno por hilo."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def pedir(self, metodo, ruta, cuerpo=None, headers=None):
+        cliente = getattr(self._local, "cliente", None)
+        if cliente is None:
+            cliente = self._local.cliente = self.app.test_client()
+        r = cliente.open(ruta, method=metodo, json=cuerpo, headers=headers or {})
+        datos = r.get_data()
+        return r.status_code, r.headers, datos
+
+
+class ClienteHTTP:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def pedir(self, metodo, ruta, cuerpo=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if cuerpo is not None:
+            data = json.dumps(cuerpo).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.url + ruta, data=data, headers=headers, method=metodo)
+        try:
+            with urllib.request.urlopen(req) as r:
+                return r.status, r.headers, r.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+
+def _medir(cliente, nombre, metodo, ruta, cuerpo=None, headers=None):
+    inicio = time.perf_counter()
+    estado, cabeceras, datos = cliente.pedir(metodo, ruta, cuerpo, headers)
+    return (nombre, time.perf_counter() - inicio, estado), cabeceras, datos
+
+
+def _en_paralelo(hilos, tareas):
+    with ThreadPoolExecutor(hilos) as pool:
+        return list(pool.map(lambda t: t(), tareas))
+
+
+# ─────────────────────────────
+# Escenarios
+# ─────────────────────────────
+def rush_ingresos(cliente, cfg):
+    """Entrada de la mañana: muchos /registrar_vehiculo concurrentes."""
+    ahora = datetime.now().isoformat(timespec="seconds")
+
+    def ingreso(i):
+        cuerpo = {"patente": f"RS{cfg['corrida']}{i:05d}", "conductor": "rush", "hora_entrada": ahora}
+        return lambda: _medir(cliente, "POST /registrar_vehiculo", "POST", "/registrar_vehiculo", cuerpo)[0]
+
+    return _en_paralelo(cfg["hilos"], [ingreso(i) for i in range(cfg["peticiones"])])
+
+
+def tormenta_cobros(cliente, cfg):
+    """Cambio de turno: cobros concurrentes de los vehículos estacionados."""
+    _, _, datos = cliente.pedir("GET", "/historial")
+    patentes = [v["patente"] for v in json.loads(datos)][: cfg["peticiones"]]
+
+    def cobro(p):
+        return lambda: _medir(cliente, "DELETE /vehiculo/<patente>", "DELETE", f"/vehiculo/{p}")[0]
+
+    return _en_paralelo(cfg["hilos"], [cobro(p) for p in patentes])
+
+
+def polling_dashboard(cliente, cfg):
+    """Paneles abiertos refrescando; la mitad usa If-None-Match como un navegador."""
+    rutas = ("/plazas", "/estadisticas", "/espacios_disponibles", "/historial", "/configuracion")
+    etags = {}
+
+    def consulta(i):
+        ruta = rutas[i % len(rutas)]
+
+        def tarea():
+            headers = {}
+            if i % 2 and ruta in etags:
+                headers["If-None-Match"] = etags[ruta]
+            medicion, cabeceras, _ = _medir(cliente, f"GET {ruta}", "GET", ruta, headers=headers)
+            if cabeceras.get("ETag"):
+                etags[ruta] = cabeceras["ETag"]
+            return medicion
+        return tarea
+
+    return _en_paralelo(cfg["hilos"], [consulta(i) for i in range(cfg["peticiones"])])
+
+
+def rafaga_login(cliente, cfg):
+    """Inicio de turno: muchos /login seguidos (hash de contraseña incluido)."""
+    correos = itertools.cycle(f"bench{i}@example.com" for i in range(cfg["usuarios"]))
+
+    def login(correo):
+        cuerpo = {"correo": correo, "contraseña": CONTRASEÑA}
+        return lambda: _medir(cliente, "POST /login", "POST", "/login", cuerpo)[0]
+
+    return _en_paralelo(
+        cfg["hilos"], [login(next(correos)) for _ in range(min(cfg["peticiones"], 200))]
+    )
+
+
+ESCENARIOS = {
+    "rush_ingresos": rush_ingresos,
+    "polling_dashboard": polling_dashboard,
+    "tormenta_cobros": tormenta_cobros,
+    "rafaga_login": rafaga_login,
+}
@@ -0,0 +1,242 @@
+# busqueda.py
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import func, select
+
+from models import db, HistorialSalida
+
+
+# ─────────────────────────────────────────────
+#  BÚSQUEDA DE PATENTES
+#  - Patentes normalizadas (mayúsculas, sin guiones ni espacios)
+#  - Lista ordenada de patentes distintas del historial, una por
+#    estacionamiento y por worker; recorrerla en orden equivale a
+#    recorrer un trie (las vecinas comparten prefijo). Se guarda
+#    también invertida para buscar desde el final
+#  - Prefijo: bisect. Aproximada: Levenshtein bit a bit (Myers) sobre
+#    el prefijo común, saltando con bisect las ramas que ya superan
+#    la distancia
+#  - Con distancia 2 se reparte la consulta en tres partes: alguna
+#    tiene que calzar casi exacta, y eso poda mucho antes
+#  - Se actualiza leyendo solo las salidas con id > último visto
+# ─────────────────────────────────────────────
+_NO_ALFANUMERICO = re.compile(r"[^0-9A-Z]")
+_FIN_RAMA = "\x7f"        # mayor que cualquier carácter de una patente normalizada
+
+
+def normalizar(patente):
+    return _NO_ALFANUMERICO.sub("", (patente or "").upper())
+
+
+def distancia(a, b, maximo):
+    """Levenshtein entre a y b, o maximo + 1 si lo supera (corta antes)."""
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        fila = [i]
+        for j, cb in enumerate(b, 1):
+            fila.append(min(fila[j - 1] + 1, anterior[j] + 1, anterior[j - 1] + (ca != cb)))
+        if min(fila) > maximo:
+            return maximo + 1
+        anterior = fila
+    return anterior[-1] if anterior[-1] <= maximo else maximo + 1
+
+
+def _minimo_prefijo(vp, vn, n):
+    """Mínimo de la suma prefija de los deltas verticales de una columna."""
+    minimo = suma = 0
+    for j in range(n):
+        suma += ((vp >> j) & 1) - ((vn >> j) & 1)
+        if suma < minimo:
+            minimo = suma
+    return minimo
+
+
+def _recorrer(claves, consulta, maximo, umbrales=()):
+    """[(distancia, clave)] de ``claves`` (ordenada) a distancia <= maximo.
+
+    umbrales[d]: distancia máxima admitida para los prefijos de largo d + 1
+    (más estricta que ``maximo`` en los primeros caracteres).
+    """
+    n = len(consulta)
+    umbrales = list(umbrales)
+    mascara, alto = (1 << n) - 1, 1 << (n - 1)
+    coincide = {}
+    for j, c in enumerate(consulta):
+        coincide[c] = coincide.get(c, 0) | (1 << j)
+    minimos = {}
+    # Columna por largo de prefijo: (VP, VN, distancia al final de la consulta)
+    columnas = [(mascara, 0, n)]
+    previa, resultado, i = "", [], 0
+    while i < len(claves):
+        clave = claves[i]
+        comun, tope = 0, min(len(clave), len(previa))
+        while comun < tope and clave[comun] == previa[comun]:
+            comun += 1
+        del columnas[comun + 1:]
+        vp, vn, puntaje = columnas[-1]
+        podada = 0
+        for d in range(comun, len(clave)):
+            x = coincide.get(clave[d], 0) | vn
+            d0 = (((x & vp) + vp) ^ vp) | x
+            hp = vn | (~(d0 | vp) & mascara)
+            hn = vp & d0
+            if hp & alto:
+                puntaje += 1
+            elif hn & alto:
+                puntaje -= 1
+            x = ((hp << 1) | 1) & mascara
+            vn = x & d0
+            vp = ((hn << 1) | ~(x | d0)) & mascara
+            columnas.append((vp, vn, puntaje))
+            minimo = minimos.get((vp, vn))
+            if minimo is None:
+                minimo = minimos[(vp, vn)] = _minimo_prefijo(vp, vn, n)
+            if d + 1 + minimo > (umbrales[d] if d < len(umbrales) else maximo):
+                podada = d + 1
+                break
+        if podada:
+            # Ninguna clave con este prefijo puede quedar dentro de la distancia
+            previa = clave[:podada]
+            i = bisect_left(claves, previa + _FIN_RAMA, i + 1)
+            continue
+        if puntaje <= maximo:
+            resultado.append((puntaje, clave))
+        previa = clave
+        i += 1
+    return resultado
+
+
+class IndicePatentes:
+    """Patentes distintas del historial de un estacionamiento."""
+
+    def __init__(self, estacionamiento_id=1, refresco_segundos=2):
+        self.estacionamiento_id = estacionamiento_id
+        self.refresco_segundos = refresco_segundos
+        self._claves = []             # normalizadas, ordenadas, sin repetir
+        self._invertidas = []         # las mismas, escritas al revés
+        self._formas = {}             # normalizada -> formas guardadas distintas de ella
+        self._ultimo_id = None
+        self._leido_en = None
+        self._lock = threading.Lock()
+
+    # ------ carga ------
+    def _cargar(self, patentes):
+        """Normaliza ``patentes`` y devuelve las claves que todavía no están.
+
+        Las búsquedas leen sin lock: ``_formas`` se actualiza reemplazando
+        conjuntos y la lista de claves se reemplaza entera.
+        """
+        nuevas = set()
+        for patente in patentes:
+            clave = normalizar(patente)
+            if not clave:
+                continue
+            nuevas.add(clave)
+            if patente != clave and patente not in self._formas.get(clave, ()):
+                self._formas[clave] = self._formas.get(clave, frozenset()) | {patente}
+        return nuevas
+
+    def actualizar(self, forzar=False):
+        ahora = time.monotonic()
+        if (
+            not forzar
+            and self._leido_en is not None
+            and ahora - self._leido_en < self.refresco_segundos
+        ):
+            return
+        with self._lock:
+            if self._ultimo_id is None:
+                # Carga inicial: DISTINCT sobre el índice (estacionamiento_id, patente)
+                ultimo = db.session.scalar(select(func.max(HistorialSalida.id))) or 0
+                self._claves = sorted(self._cargar(db.session.scalars(
+                    select(HistorialSalida.patente)
+                    .where(HistorialSalida.estacionamiento_id == self.estacionamiento_id)
+                    .distinct()
+                )))
+                self._invertidas = sorted(c[::-1] for c in self._claves)
+            else:
+                filas = db.session.execute(
+                    select(HistorialSalida.id, HistorialSalida.patente).where(
+                        HistorialSalida.id > self._ultimo_id,
+                        HistorialSalida.estacionamiento_id == self.estacionamiento_id,
+                    )
+                ).all()
+                ultimo = max((f.id for f in filas), default=self._ultimo_id)
+                nuevas = [c for c in self._cargar(f.patente for f in filas) if not self._existe(c)]
+                if nuevas:
+                    self._claves = sorted(self._claves + nuevas)
+                    self._invertidas = sorted(self._invertidas + [c[::-1] for c in nuevas])
+            self._ultimo_id = ultimo
+            self._leido_en = ahora
+
+    def _existe(self, clave):
+        i = bisect_left(self._claves, clave)
+        return i < len(self._claves) and self._claves[i] == clave
+
+    def formas(self, clave):
+        """Valores de ``patente`` tal como pueden estar guardados en la BD."""
+        return {clave} | self._formas.get(clave, frozenset())
+
+    def __len__(self):
+        return len(self._claves)
+
+    # ------ consultas ------
+    def por_prefijo(self, prefijo, limite):
+        claves = self._claves
+        i = bisect_left(claves, prefijo)
+        resultado = []
+        while i < len(claves) and len(resultado) < limite and claves[i].startswith(prefijo):
+            resultado.append(claves[i])
+            i += 1
+        return resultado
+
+    def aproximadas(self, consulta, maximo):
+        """[(distancia, clave)] con distancia de edición <= maximo."""
+        if not consulta:
+            # Sin columnas para el vector de bits: la distancia es el largo
+            return [(len(c), c) for c in self._claves if len(c) <= maximo]
+        if maximo < 2:
+            return _recorrer(self._claves, consulta, maximo)
+        # Con 2 errores y la consulta en tres partes (a, b, c): o a queda
+        # intacta, o c, o hay uno en a y otro en c (a + b con a lo más 1).
+        # Un prefijo de largo L solo alcanza posiciones <= L + errores, por
+        # eso el umbral estricto cubre hasta largo - umbral.
+        n = len(consulta)
+        a = c = n // 3
+        encontradas = dict(
+            (clave, d) for d, clave in _recorrer(self._claves, consulta, maximo, [0] * a)
+        )
+        encontradas.update(
+            (clave, d)
+            for d, clave in _recorrer(self._claves, consulta, maximo, [1] * (n - c - 1))
+        )
+        encontradas.update(
+            (clave[::-1], d)
+            for d, clave in _recorrer(self._invertidas, consulta[::-1], maximo, [0] * c)
+        )
+        return [(d, clave) for clave, d in encontradas.items()]
+
+
+class IndicesPorLote:
+    """Un IndicePatentes por estacionamiento, creado al primer uso."""
+
+    def __init__(self, refresco_segundos=2):
+        self.refresco_segundos = refresco_segundos
+        self._indices = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, estacionamiento_id):
+        indice = self._indices.get(estacionamiento_id)
+        if indice is None:
+            with self._lock:
+                indice = self._indices.setdefault(
+                    estacionamiento_id,
+                    IndicePatentes(estacionamiento_id, self.refresco_segundos),
+                )
+        indice.actualizar()
+        return indice
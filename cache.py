@@ -0,0 +1,108 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, VersionCache
+
+
+# ─────────────────────────────────────────────
+#  CACHÉ LOCAL DE DATOS DE REFERENCIA
+#  - LRU acotado por tamaño + TTL por entrada
+#  - Cada entrada depende de uno o más "espacios"
+#  - invalidar() sube la versión del espacio en la BD,
+#    así los demás workers notan el cambio
+#  - Los espacios de un estacionamiento llevan su id ("plazas:2"),
+#    así cada uno se invalida por separado; su fila se crea con un
+#    upsert la primera vez que se invalida
+# ─────────────────────────────────────────────
+ESPACIOS = ("configuracion", "plazas", "usuarios", "vehiculos", "estacionamientos")
+POR_LOTE = ("configuracion", "plazas", "vehiculos", "cuadraturas")
+
+
+def por_lote(estacionamiento_id, *espacios):
+    """("plazas", "usuarios") → ("plazas:2", "usuarios"): los globales no cambian."""
+    return tuple(
+        f"{e}:{estacionamiento_id}" if e in POR_LOTE else e for e in espacios
+    )
+
+
+class CacheLocal:
+    """Caché por proceso. Las versiones de la BD se releen cada
+    ``intervalo_version`` segundos, así que otro worker ve un cambio con
+    ese retraso como máximo (y de inmediato en el worker que lo hizo)."""
+
+    def __init__(self, ttl=30, maximo=256, intervalo_version=1.0):
+        self.ttl = ttl
+        self.maximo = maximo
+        self.intervalo_version = intervalo_version
+        self._datos = OrderedDict()     # clave -> (vence, versiones, valor)
+        self._versiones = {}
+        self._versiones_leidas_en = None
+        self._lock = threading.Lock()
+
+    # ------ versiones ------
+    def versiones(self, forzar=False):
+        ahora = time.monotonic()
+        if (
+            forzar
+            or self._versiones_leidas_en is None
+            or ahora - self._versiones_leidas_en > self.intervalo_version
+        ):
+            filas = db.session.execute(
+                select(VersionCache.espacio, VersionCache.version)
+            ).all()
+            with self._lock:
+                self._versiones = dict(filas)
+                self._versiones_leidas_en = ahora
+        return self._versiones
+
+    def invalidar(self, *espacios):
+        """Sube la versión de los espacios dentro de la transacción actual.
+
+        Conviene llamarlo justo antes del commit para no retener el lock de
+        la fila más de lo necesario.
+        """
+        # UPDATE y luego INSERT dejaría a dos workers insertar la misma fila
+        # nueva (IntegrityError); el upsert lo resuelve en la BD
+        dialecto = db.session.get_bind().dialect.name
+        stmt = (postgresql if dialecto == "postgresql" else sqlite).insert(VersionCache)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[VersionCache.espacio],
+            set_={"version": VersionCache.version + 1},
+        )
+        for espacio in sorted(espacios):     # mismo orden de locks en todos los workers
+            db.session.execute(stmt.values(espacio=espacio, version=1))
+        with self._lock:
+            self._versiones_leidas_en = None
+
+    # ------ lectura ------
+    def obtener(self, clave, espacios, calcular, ttl=None):
+        """Devuelve el valor cacheado o lo calcula con ``calcular()``.
+
+        ``ttl`` reemplaza el de la instancia (datos que ya no cambian).
+        """
+        actuales = self.versiones()
+        firma = tuple(actuales.get(e, 0) for e in espacios)
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada and entrada[0] > ahora and entrada[1] == firma:
+                self._datos.move_to_end(clave)
+                return entrada[2]
+
+        valor = calcular()
+        with self._lock:
+            self._datos[clave] = (ahora + (self.ttl if ttl is None else ttl), firma, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._versiones_leidas_en = None
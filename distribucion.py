@@ -0,0 +1,86 @@
+# distribucion.py
+import string
+
+
+# ─────────────────────────────────────────────
+#  DISTRIBUCIÓN DE PLAZAS (layout)
+#  - Una especificación describe filas A–Z, un rango de números por
+#    fila y exclusiones ("A13" o números sueltos por fila)
+#  - expandir() genera {codigo: (fila, numero)} con códigos "A01"
+#  - diferencia() compara contra lo que hay en la BD y devuelve solo
+#    lo que cambia, para aplicarlo con inserts/deletes masivos
+# ─────────────────────────────────────────────
+FILAS = string.ascii_uppercase
+MAX_PLAZAS = 20000
+MAX_NUMERO = 9999        # Plaza.codigo es String(5): fila + 4 dígitos
+
+
+def codigo(fila, numero):
+    return f"{fila}{numero:02d}"
+
+
+def _rango(fila, valor):
+    """[desde, hasta] o {"desde", "hasta", "excluir"} → (desde, hasta, excluidos)."""
+    if isinstance(valor, dict):
+        desde, hasta = valor.get("desde", 1), valor.get("hasta")
+        excluir = valor.get("excluir") or []
+    elif isinstance(valor, (list, tuple)) and len(valor) == 2:
+        (desde, hasta), excluir = valor, []
+    else:
+        raise ValueError(f"Rango inválido para la fila {fila}")
+    if not all(isinstance(n, int) and not isinstance(n, bool) for n in (desde, hasta, *excluir)):
+        raise ValueError(f"Rango inválido para la fila {fila}")
+    if not 1 <= desde <= hasta:
+        raise ValueError(f"Rango inválido para la fila {fila}")
+    if hasta > MAX_NUMERO:
+        raise ValueError(f"Número máximo de plaza: {MAX_NUMERO} (fila {fila})")
+    return desde, hasta, set(excluir)
+
+
+def expandir(spec):
+    """Especificación → {codigo: (fila, numero)}. ValueError si no es válida.
+
+    spec = {"filas": {"A": [1, 40], "B": {"desde": 1, "hasta": 30, "excluir": [13]}},
+            "excluir": ["A07"]}
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get("filas"), dict):
+        raise ValueError("Se espera un objeto 'filas'")
+    excluidos = spec.get("excluir") or []
+    if not isinstance(excluidos, list):
+        raise ValueError("'excluir' debe ser una lista de códigos")
+    excluidos = {str(c).upper() for c in excluidos}
+
+    plazas = {}
+    for fila, valor in spec["filas"].items():
+        fila = str(fila).upper()
+        if len(fila) != 1 or fila not in FILAS:
+            raise ValueError(f"Fila inválida: {fila}")
+        desde, hasta, sin = _rango(fila, valor)
+        if len(plazas) + hasta - desde + 1 > MAX_PLAZAS:
+            raise ValueError(f"Máximo {MAX_PLAZAS} plazas por estacionamiento")
+        for numero in range(desde, hasta + 1):
+            c = codigo(fila, numero)
+            if numero not in sin and c not in excluidos:
+                plazas[c] = (fila, numero)
+    return plazas
+
+
+def diferencia(deseadas, existentes):
+    """Compara el layout pedido con las plazas actuales.
+
+    existentes: iterable de (id, codigo, fila, numero, ocupado).
+    Devuelve (nuevas, sobrantes, movidas): nuevas son (codigo, fila, numero),
+    sobrantes las filas existentes que ya no están y movidas (id, fila, numero)
+    para códigos que siguen pero con otra fila/número.
+    """
+    sobrantes, movidas, vistos = [], [], set()
+    for p in existentes:
+        destino = deseadas.get(p.codigo)
+        if destino is None:
+            sobrantes.append(p)
+            continue
+        vistos.add(p.codigo)
+        if (p.fila, p.numero) != destino:
+            movidas.append((p.id, *destino))
+    nuevas = [(c, f, n) for c, (f, n) in deseadas.items() if c not in vistos]
+    return nuevas, sobrantes, movidas
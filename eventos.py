@@ -0,0 +1,147 @@
+# eventos.py
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from models import db, EventoPlaza
+
+
+# ─────────────────────────────────────────────
+#  EVENTOS DE OCUPACIÓN (SSE)
+#  - registrar(): guarda el cambio en la transacción del ingreso/cobro
+#  - Difusor: un hilo por worker lee eventos nuevos de la BD (de todos
+#    los estacionamientos) y los reparte a las colas de los clientes
+#    conectados a ese estacionamiento
+# ─────────────────────────────────────────────
+CERRAR = object()   # la cola se desbordó: el cliente debe reconectarse
+RECARGAR = "*"      # código de evento: cambió el layout, hace falta otro snapshot
+
+_poda = {"ultima": 0.0}
+
+
+def registrar(cambios, estacionamiento_id, retencion=600):
+    """cambios: iterable de (codigo, ocupado). No hace commit."""
+    ahora = datetime.now()
+    filas = [
+        {"estacionamiento_id": estacionamiento_id, "codigo": c, "ocupado": o, "creado": ahora}
+        for c, o in cambios
+    ]
+    if filas:
+        db.session.execute(insert(EventoPlaza), filas)
+    if time.monotonic() - _poda["ultima"] > 60:
+        _poda["ultima"] = time.monotonic()
+        db.session.execute(
+            delete(EventoPlaza).where(
+                EventoPlaza.creado < ahora - timedelta(seconds=retencion)
+            )
+        )
+
+
+def formatear(evento, datos, id_=None):
+    cabecera = f"id: {id_}\n" if id_ is not None else ""
+    return f"{cabecera}event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+class Difusor:
+    """Reparte los eventos de ocupación a los clientes SSE de este proceso.
+
+    Con N clientes conectados hay una sola consulta por intervalo y por
+    worker, no una por cliente. El hilo se detiene cuando no queda nadie.
+    """
+
+    # En PostgreSQL un id menor puede confirmarse después de uno mayor, así
+    # que se relee una ventana hacia atrás y se ignoran los ids ya vistos.
+    MARGEN_IDS = 200
+
+    def __init__(self, app, intervalo=1.0, max_clientes=500, tamaño_cola=1000):
+        self.app = app
+        self.intervalo = intervalo
+        self.max_clientes = max_clientes
+        self.tamaño_cola = tamaño_cola
+        self._clientes = {}             # cola -> estacionamiento_id
+        self._ultimo_id = None
+        self._piso = 0                  # los eventos hasta aquí ya están en el snapshot
+        self._vistos = set()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def suscribir(self, estacionamiento_id):
+        """Devuelve una cola para el cliente, o None si el worker está lleno.
+
+        Hay que suscribirse antes de leer el snapshot: así ningún cambio
+        posterior al snapshot se pierde (a lo sumo llega repetido).
+        """
+        inicio = self.ultimo_id()
+        with self._lock:
+            if len(self._clientes) >= self.max_clientes:
+                return None
+            cola = queue.Queue(self.tamaño_cola)
+            self._clientes[cola] = estacionamiento_id
+            if self._hilo is None:
+                self._ultimo_id = self._piso = inicio
+                self._vistos = set()
+                self._hilo = threading.Thread(
+                    target=self._bucle, name="difusor-plazas", daemon=True
+                )
+                self._hilo.start()
+        return cola
+
+    def desuscribir(self, cola):
+        with self._lock:
+            self._clientes.pop(cola, None)
+
+    def ultimo_id(self):
+        """Id del último evento en la BD (para acompañar el snapshot)."""
+        return db.session.scalar(select(func.max(EventoPlaza.id))) or 0
+
+    def _leer(self):
+        with self.app.app_context():
+            return db.session.execute(
+                select(
+                    EventoPlaza.id, EventoPlaza.estacionamiento_id,
+                    EventoPlaza.codigo, EventoPlaza.ocupado,
+                )
+                .where(EventoPlaza.id > self._ultimo_id - self.MARGEN_IDS)
+                .order_by(EventoPlaza.id)
+            ).all()
+
+    def _bucle(self):
+        while True:
+            with self._lock:
+                if not self._clientes:
+                    self._hilo = None
+                    return
+                clientes = list(self._clientes.items())
+            try:
+                nuevos = self._leer()
+            except Exception as e:
+                self.app.logger.warning("Difusor de plazas: %s", e)
+                nuevos = []
+            for ev in nuevos:
+                if ev.id in self._vistos or ev.id <= self._piso:
+                    continue
+                self._vistos.add(ev.id)
+                self._ultimo_id = max(self._ultimo_id, ev.id)
+                for cola, lote in clientes:
+                    if lote != ev.estacionamiento_id:
+                        continue
+                    try:
+                        cola.put_nowait(ev)
+                    except queue.Full:
+                        self._cerrar(cola)
+            limite = self._ultimo_id - self.MARGEN_IDS
+            self._vistos = {i for i in self._vistos if i > limite}
+            time.sleep(self.intervalo)
+
+    def _cerrar(self, cola):
+        self.desuscribir(cola)
+        while True:
+            try:
+                cola.get_nowait()
+            except queue.Empty:
+                break
+        cola.put_nowait(CERRAR)
@@ -0,0 +1,97 @@
+# exportacion.py
+import csv
+import io
+import zlib
+
+from serializacion import dumps, iso, dos_decimales
+
+
+# ─────────────────────────────────────────────
+#  EXPORTACIÓN DE SALIDAS (contabilidad)
+#  - Recibe lotes de filas ordenadas por hora_salida ascendente
+#  - Intercala un subtotal al cerrar cada día y un total al final
+#  - CSV o NDJSON, opcionalmente comprimido con gzip al vuelo
+# ─────────────────────────────────────────────
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+ENCABEZADO_CSV = ("tipo", "fecha", "id", "patente", "conductor", "correo", "entrada",
+                  "salida", "duracion", "total", "posicion", "cantidad")
+
+
+def _registros(lotes):
+    """Convierte lotes de filas en lotes de (tipo, dict), con subtotales por día."""
+    dia, cantidad, recaudacion = None, 0, 0.0
+    total_cantidad, total_recaudacion = 0, 0.0
+
+    def subtotal():
+        return ("subtotal", {"fecha": dia.isoformat(), "cantidad": cantidad,
+                             "total": round(recaudacion, 2)})
+
+    for lote in lotes:
+        salida = []
+        for fila in lote:
+            d = fila.hora_salida.date()
+            if d != dia:
+                if dia is not None:
+                    salida.append(subtotal())
+                dia, cantidad, recaudacion = d, 0, 0.0
+            cantidad += 1
+            recaudacion += fila.total_pagado or 0
+            salida.append(("salida", {
+                "id": fila.id,
+                "fecha": d.isoformat(),
+                "patente": fila.patente,
+                "conductor": fila.conductor,
+                "correo": fila.correo,
+                "entrada": iso(fila.hora_entrada),
+                "salida": iso(fila.hora_salida),
+                "duracion": dos_decimales(fila.duracion_minutos),
+                "total": fila.total_pagado,
+                "posicion": fila.posicion,
+            }))
+        total_cantidad += len(lote)
+        total_recaudacion += sum(f.total_pagado or 0 for f in lote)
+        yield salida
+
+    final = [subtotal()] if dia is not None else []
+    final.append(("total", {"cantidad": total_cantidad, "total": round(total_recaudacion, 2)}))
+    yield final
+
+
+def csv_texto(lotes):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    escritor.writerow(ENCABEZADO_CSV)
+    for registros in _registros(lotes):
+        for tipo, r in registros:
+            escritor.writerow([tipo] + [r.get(c) for c in ENCABEZADO_CSV[1:]])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def ndjson_texto(lotes):
+    for registros in _registros(lotes):
+        yield "".join(dumps({"tipo": tipo, **r}) + "\n" for tipo, r in registros)
+
+
+def comprimir(partes):
+    """gzip en streaming: solo emite cuando zlib tiene bytes listos."""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31 → cabecera gzip
+    for parte in partes:
+        bloque = compresor.compress(parte.encode())
+        if bloque:
+            yield bloque
+    yield compresor.flush()
+
+
+def exportar(lotes, formato, gzip=False):
+    """Devuelve (generador, mimetype, extensión) para armar la Response."""
+    mimetype, extension = FORMATOS[formato]
+    texto = csv_texto(lotes) if formato == "csv" else ndjson_texto(lotes)
+    if gzip:
+        return comprimir(texto), "application/gzip", extension + ".gz"
+    return (p.encode() for p in texto), mimetype, extension
@@ -0,0 +1,23 @@
+# gunicorn.conf.py
+import os
+
+
+# ─────────────────────────────────────────────
+#  SERVIDOR WEB
+#  - Worker gevent: cada conexión es un greenlet y no un hilo, así
+#    cientos de clientes de /plazas/stream esperan eventos sin
+#    quitarle capacidad al resto de las rutas
+#  - psycopg2 es C y bloquearía el loop en cada consulta:
+#    psycogreen lo vuelve cooperativo en cada worker
+# ─────────────────────────────────────────────
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_connections = int(os.getenv("WEB_CONEXIONES", 1000))
+
+
+def post_fork(server, worker):
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:      # sin psycopg2 (SQLite local) no hay nada que parchar
+        return
+    patch_psycopg()
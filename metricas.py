@@ -0,0 +1,272 @@
+# metricas.py
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+
+# ─────────────────────────────────────────────
+#  MÉTRICAS
+#  - Histograma de latencia por ruta (before/after_request)
+#  - Conteo y tiempo de SQL por petición (eventos de SQLAlchemy)
+#  - Header Server-Timing en cada respuesta que no va en stream
+#  - Las respuestas en stream se miden al cerrarse (su SQL corre
+#    mientras se envía el cuerpo); los SSE quedan fuera porque duran
+#    lo que dure la conexión
+#  - Latencia de los trabajos en segundo plano (trabajos.py)
+#  - Cada worker vuelca sus contadores a un archivo <pid>.json en un
+#    directorio propio de la instancia; /metrics suma los de procesos
+#    vivos (borra los de workers que terminaron) y responde en formato
+#    de texto de Prometheus
+# ─────────────────────────────────────────────
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100)
+BUCKETS_TRABAJOS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+PREFIJO = "mi_estaciona"
+_CLAVE_ENTORNO = "mi_estaciona.metricas"
+
+
+class Registro:
+    """Contadores de este proceso. Las claves son "endpoint|metodo|estado"."""
+
+    def __init__(self):
+        self.latencia = {}      # clave -> [buckets..., suma, cantidad]
+        self.consultas = {}     # endpoint -> [buckets..., suma, cantidad]
+        self.sql_segundos = {}  # endpoint -> segundos
+        self.trabajos = {}      # "tipo|resultado" -> [buckets..., suma, cantidad]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _observar(tabla, clave, buckets, valor):
+        fila = tabla.get(clave)
+        if fila is None:
+            fila = tabla[clave] = [0] * (len(buckets) + 2)
+        for i, limite in enumerate(buckets):
+            if valor <= limite:
+                fila[i] += 1
+        fila[-2] += valor
+        fila[-1] += 1
+
+    def observar(self, endpoint, metodo, estado, segundos, consultas, sql_segundos):
+        with self._lock:
+            self._observar(
+                self.latencia, f"{endpoint}|{metodo}|{estado}", BUCKETS_LATENCIA, segundos
+            )
+            self._observar(self.consultas, endpoint, BUCKETS_CONSULTAS, consultas)
+            self.sql_segundos[endpoint] = self.sql_segundos.get(endpoint, 0) + sql_segundos
+
+    def observar_trabajo(self, tipo, resultado, espera):
+        """espera: desde que se encoló hasta que terminó este intento."""
+        with self._lock:
+            self._observar(self.trabajos, f"{tipo}|{resultado}", BUCKETS_TRABAJOS, espera)
+
+    def a_dict(self):
+        with self._lock:
+            return json.loads(json.dumps({
+                "latencia": self.latencia,
+                "consultas": self.consultas,
+                "sql_segundos": self.sql_segundos,
+                "trabajos": self.trabajos,
+            }))
+
+
+registro = Registro()
+_volcado = {"ultimo": 0.0}
+
+
+# ─────────────────────────────
+# Agregación entre workers
+# ─────────────────────────────
+def _archivo(app):
+    return os.path.join(app.config["METRICAS_DIR"], f"{os.getpid()}.json")
+
+
+def volcar(app):
+    """Escribe los contadores de este worker (reemplazo atómico del archivo)."""
+    os.makedirs(app.config["METRICAS_DIR"], exist_ok=True)
+    destino = _archivo(app)
+    temporal = f"{destino}.tmp"
+    with open(temporal, "w") as f:
+        json.dump(registro.a_dict(), f)
+    os.replace(temporal, destino)
+    _volcado["ultimo"] = time.monotonic()
+
+
+def _sumar(destino, origen):
+    for clave, fila in origen.items():
+        actual = destino.get(clave)
+        if actual is None:
+            destino[clave] = list(fila) if isinstance(fila, list) else fila
+        elif isinstance(fila, list):
+            destino[clave] = [a + b for a, b in zip(actual, fila)]
+        else:
+            destino[clave] = actual + fila
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True             # existe, pero es de otro usuario
+    return True
+
+
+def agregado(app):
+    """Suma los archivos de los workers vivos y borra los de los que terminaron."""
+    total = {"latencia": {}, "consultas": {}, "sql_segundos": {}, "trabajos": {}}
+    workers = 0
+    for ruta in glob.glob(os.path.join(app.config["METRICAS_DIR"], "*.json")):
+        try:
+            pid = int(os.path.basename(ruta)[:-len(".json")])
+        except ValueError:
+            continue
+        try:
+            if not _vivo(pid):
+                os.remove(ruta)
+                continue
+            with open(ruta) as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            continue
+        workers += 1
+        for seccion in total:
+            _sumar(total[seccion], datos.get(seccion, {}))
+    return total, workers
+
+
+def _etiquetas(**kw):
+    return ",".join(f'{k}="{v}"' for k, v in kw.items())
+
+
+def _histograma(lineas, nombre, ayuda, tabla, buckets, etiquetas):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} histogram")
+    for clave, fila in sorted(tabla.items()):
+        base = etiquetas(clave)
+        for limite, n in zip(buckets, fila):
+            lineas.append(f'{nombre}_bucket{{{base},le="{limite}"}} {n}')
+        lineas.append(f'{nombre}_bucket{{{base},le="+Inf"}} {fila[-1]}')
+        lineas.append(f"{nombre}_sum{{{base}}} {fila[-2]}")
+        lineas.append(f"{nombre}_count{{{base}}} {fila[-1]}")
+
+
+def texto_prometheus(total, workers):
+    lineas = []
+
+    def por_ruta(clave):
+        endpoint, metodo, estado = clave.split("|")
+        return _etiquetas(endpoint=endpoint, metodo=metodo, estado=estado)
+
+    _histograma(
+        lineas, f"{PREFIJO}_http_duracion_segundos",
+        "Latencia de las peticiones HTTP por ruta.",
+        total["latencia"], BUCKETS_LATENCIA, por_ruta,
+    )
+    _histograma(
+        lineas, f"{PREFIJO}_sql_consultas_por_peticion",
+        "Sentencias SQL emitidas por petición.",
+        total["consultas"], BUCKETS_CONSULTAS, lambda e: _etiquetas(endpoint=e),
+    )
+    nombre = f"{PREFIJO}_sql_segundos_total"
+    lineas.append(f"# HELP {nombre} Tiempo acumulado en la BD por ruta.")
+    lineas.append(f"# TYPE {nombre} counter")
+    for endpoint, segundos in sorted(total["sql_segundos"].items()):
+        lineas.append(f"{nombre}{{{_etiquetas(endpoint=endpoint)}}} {segundos}")
+
+    def por_trabajo(clave):
+        tipo, resultado = clave.split("|")
+        return _etiquetas(tipo=tipo, resultado=resultado)
+
+    _histograma(
+        lineas, f"{PREFIJO}_trabajo_latencia_segundos",
+        "Tiempo desde que se encola un trabajo hasta que termina cada intento.",
+        total["trabajos"], BUCKETS_TRABAJOS, por_trabajo,
+    )
+
+    nombre = f"{PREFIJO}_workers_reportando"
+    lineas.append(f"# HELP {nombre} Workers con métricas volcadas.")
+    lineas.append(f"# TYPE {nombre} gauge")
+    lineas.append(f"{nombre} {workers}")
+    return "\n".join(lineas) + "\n"
+
+
+# ─────────────────────────────
+# Enganche con Flask / SQLAlchemy
+# ─────────────────────────────
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    context.metricas_t0 = time.perf_counter()
+
+
+def _despues_sql(conn, cursor, statement, parameters, context, executemany):
+    # En el environ y no en g: stream_with_context vuelve a empujar la petición
+    # con un contexto de app nuevo, pero el environ es el mismo
+    if has_request_context():
+        medida = request.environ.get(_CLAVE_ENTORNO)
+        if medida is not None:
+            medida["sql_n"] += 1
+            medida["sql_t"] += time.perf_counter() - context.metricas_t0
+
+
+def init_app(app):
+    # Por instancia: los PID solo identifican procesos de esta máquina
+    app.config.setdefault("METRICAS_DIR", os.path.join(app.instance_path, "metricas"))
+    app.config.setdefault("METRICAS_VOLCADO_SEGUNDOS", 5)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _antes_sql)
+            event.listen(engine, "after_cursor_execute", _despues_sql)
+
+    @app.before_request
+    def _iniciar():
+        request.environ[_CLAVE_ENTORNO] = {
+            "inicio": time.perf_counter(), "sql_n": 0, "sql_t": 0.0,
+        }
+
+    def observar(medida, endpoint, metodo, estado):
+        duracion = time.perf_counter() - medida["inicio"]
+        registro.observar(endpoint, metodo, estado, duracion, medida["sql_n"], medida["sql_t"])
+        if time.monotonic() - _volcado["ultimo"] > app.config["METRICAS_VOLCADO_SEGUNDOS"]:
+            try:
+                volcar(app)
+            except OSError as e:
+                app.logger.warning("No se pudieron volcar las métricas: %s", e)
+        return duracion
+
+    @app.after_request
+    def _registrar(respuesta):
+        medida = request.environ.get(_CLAVE_ENTORNO)
+        if medida is None:
+            return respuesta
+        endpoint = request.url_rule.rule if request.url_rule else "sin_ruta"
+        if respuesta.is_streamed:
+            if respuesta.mimetype != "text/event-stream":
+                # El generador aún no corrió: se mide cuando termina de enviarse
+                metodo, estado = request.method, respuesta.status_code
+                respuesta.call_on_close(lambda: observar(medida, endpoint, metodo, estado))
+            return respuesta
+        duracion = observar(medida, endpoint, request.method, respuesta.status_code)
+        respuesta.headers["Server-Timing"] = (
+            f'app;dur={duracion * 1000:.1f}, '
+            f'db;dur={medida["sql_t"] * 1000:.1f};desc="{medida["sql_n"]} consultas"'
+        )
+        return respuesta
+
+
+def respuesta_metricas(app, adicional=""):
+    """adicional: texto Prometheus ya formateado (p. ej. gauges leídos de la BD)."""
+    volcar(app)
+    total, workers = agregado(app)
+    return Response(
+        texto_prometheus(total, workers) + adicional,
+        mimetype="text/plain; version=0.0.4",
+    )
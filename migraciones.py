@@ -0,0 +1,252 @@
+# migraciones.py
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import AddConstraint, CreateTable
+
+from models import (
+    db, Plaza, Vehiculo, HistorialSalida, ResumenSalida, VersionCache, EventoPlaza,
+    Configuracion, Trabajo, Estacionamiento, Cuadratura,
+)
+import resumen
+import cache
+
+
+# ─────────────────────────────────────────────
+#  MIGRACIONES VERSIONADAS
+#  - Cada migración corre en su propia transacción
+#  - La versión aplicada queda en esquema_version
+#  - Son idempotentes: sirven para BDs nuevas y existentes
+# ─────────────────────────────────────────────
+_meta = MetaData()
+esquema_version = Table(
+    "esquema_version",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("descripcion", String(200), nullable=False),
+    Column("aplicada", DateTime, nullable=False),
+)
+
+MIGRACIONES = []
+
+
+class ErrorMigracion(Exception):
+    pass
+
+
+def migracion(version, descripcion):
+    def registrar(fn):
+        MIGRACIONES.append((version, descripcion, fn))
+        return fn
+    return registrar
+
+
+def _crear_indices(conn, *indices):
+    for indice in indices:
+        indice.create(conn, checkfirst=True)
+
+
+def _indice(modelo, nombre):
+    return next(i for i in modelo.__table__.indexes if i.name == nombre)
+
+
+def _agregar_columnas(conn, modelo, *nombres):
+    """ALTER TABLE ADD COLUMN de las columnas del modelo que falten en la BD."""
+    tabla = modelo.__table__
+    existentes = {c["name"] for c in inspect(conn).get_columns(tabla.name)}
+    for nombre in nombres:
+        if nombre in existentes:
+            continue
+        columna = tabla.c[nombre]
+        ddl = f"ALTER TABLE {tabla.name} ADD COLUMN {nombre} "
+        ddl += columna.type.compile(dialect=conn.dialect)
+        if columna.server_default is not None:
+            ddl += f" DEFAULT {columna.server_default.arg}"
+            if not columna.nullable:
+                ddl += " NOT NULL"
+        # SQLite no admite agregar una FK con ALTER; la tabla nueva ya la trae
+        if conn.dialect.name != "sqlite":
+            for fk in columna.foreign_keys:
+                ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+        conn.exec_driver_sql(ddl)
+
+
+def _borrar_indices(conn, tabla, *nombres):
+    existentes = {i["name"] for i in inspect(conn).get_indexes(tabla)}
+    for nombre in nombres:
+        if nombre in existentes:
+            conn.exec_driver_sql(f"DROP INDEX {nombre}")
+
+
+def _reconstruir_tabla_sqlite(conn, modelo):
+    """Recrea la tabla con la definición actual del modelo copiando los datos.
+
+    SQLite no permite quitar ni cambiar restricciones con ALTER TABLE.
+    """
+    tabla = modelo.__table__
+    temporal = f"{tabla.name}__nueva"
+    columnas = [c["name"] for c in inspect(conn).get_columns(tabla.name)]
+    ddl = str(CreateTable(tabla).compile(dialect=conn.dialect))
+    conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {tabla.name} ", f"CREATE TABLE {temporal} ", 1))
+    lista = ", ".join(c for c in columnas if c in tabla.c)
+    conn.exec_driver_sql(f"INSERT INTO {temporal} ({lista}) SELECT {lista} FROM {tabla.name}")
+    conn.exec_driver_sql(f"DROP TABLE {tabla.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {temporal} RENAME TO {tabla.name}")
+    _crear_indices(conn, *tabla.indexes)
+
+
+# ─────────────────────────────
+# Migraciones
+# ─────────────────────────────
+@migracion(1, "Índices en plazas.ocupado, vehiculos.patente e historial_salida.hora_salida")
+def _indices_busqueda(conn):
+    # DDL fijo: los modelos ya tienen los índices por estacionamiento (migración 7)
+    try:
+        for ddl in (
+            "CREATE INDEX IF NOT EXISTS ix_plazas_ocupado_fila_numero "
+            "ON plazas (ocupado, fila, numero)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_vehiculos_patente_activa "
+            "ON vehiculos (patente) WHERE hora_salida IS NULL",
+            "CREATE INDEX IF NOT EXISTS ix_historial_salida_hora_salida "
+            "ON historial_salida (hora_salida, id)",
+        ):
+            conn.exec_driver_sql(ddl)
+    except IntegrityError as e:
+        raise ErrorMigracion(
+            "Hay patentes estacionadas más de una vez en vehiculos; "
+            "resuélvelas antes de migrar"
+        ) from e
+
+
+@migracion(2, "Tabla resumen_salidas calculada desde el historial")
+def _resumen_salidas(conn):
+    # El cálculo se hace en la migración 7, cuando el historial ya tiene
+    # estacionamiento_id
+    ResumenSalida.__table__.create(conn, checkfirst=True)
+
+
+@migracion(3, "Tabla cache_versiones para invalidar cachés entre workers")
+def _cache_versiones(conn):
+    VersionCache.__table__.create(conn, checkfirst=True)
+    existentes = set(conn.execute(VersionCache.__table__.select()).scalars())
+    nuevos = [{"espacio": e, "version": 0} for e in cache.ESPACIOS if e not in existentes]
+    if nuevos:
+        conn.execute(VersionCache.__table__.insert(), nuevos)
+
+
+@migracion(4, "Tabla eventos_plaza para /plazas/stream")
+def _eventos_plaza(conn):
+    EventoPlaza.__table__.create(conn, checkfirst=True)
+
+
+@migracion(5, "Reglas de tarifa en configuracion (primera hora, tope, nocturna)")
+def _reglas_tarifa(conn):
+    _agregar_columnas(
+        conn, Configuracion,
+        "primera_hora", "tope_diario", "tarifa_nocturna", "noche_inicio", "noche_fin",
+    )
+
+
+@migracion(6, "Tabla trabajos (cola de recibos y webhooks)")
+def _trabajos(conn):
+    Trabajo.__table__.create(conn, checkfirst=True)
+
+
+@migracion(7, "Estacionamientos: estacionamiento_id en plazas, vehículos, historial y más")
+def _estacionamientos(conn):
+    Estacionamiento.__table__.create(conn, checkfirst=True)
+    if conn.execute(Estacionamiento.__table__.select().limit(1)).first() is None:
+        conn.execute(
+            Estacionamiento.__table__.insert(),
+            [{"id": 1, "nombre": "Principal", "creado": datetime.now()}],
+        )
+        if conn.dialect.name == "postgresql":
+            # El id se insertó a mano: la secuencia debe seguir desde ahí
+            conn.exec_driver_sql(
+                "SELECT setval(pg_get_serial_sequence('estacionamientos', 'id'), 1)"
+            )
+
+    for modelo in (Plaza, Vehiculo, HistorialSalida, Cuadratura, Configuracion, EventoPlaza):
+        _agregar_columnas(conn, modelo, "estacionamiento_id")
+
+    # El código de plaza pasa de único global a único por estacionamiento
+    unicos = inspect(conn).get_unique_constraints("plazas")
+    viejo = next((u for u in unicos if u["column_names"] == ["codigo"]), None)
+    if viejo is not None:
+        if conn.dialect.name == "sqlite":
+            _reconstruir_tabla_sqlite(conn, Plaza)
+        else:
+            conn.exec_driver_sql(f"ALTER TABLE plazas DROP CONSTRAINT {viejo['name']}")
+            conn.execute(AddConstraint(next(
+                c for c in Plaza.__table__.constraints if c.name == "uq_plazas_lote_codigo"
+            )))
+
+    _borrar_indices(conn, "plazas", "ix_plazas_ocupado_fila_numero")
+    _borrar_indices(conn, "vehiculos", "ux_vehiculos_patente_activa")
+    _borrar_indices(conn, "historial_salida", "ix_historial_salida_hora_salida")
+    _crear_indices(
+        conn,
+        _indice(Plaza, "ix_plazas_lote_ocupado_fila_numero"),
+        _indice(Vehiculo, "ux_vehiculos_lote_patente_activa"),
+        _indice(Vehiculo, "ix_vehiculos_lote_plaza"),
+        _indice(HistorialSalida, "ix_historial_salida_lote_hora_salida"),
+        _indice(Cuadratura, "ix_cuadraturas_lote_jornada"),
+    )
+    try:
+        _crear_indices(conn, _indice(Configuracion, "ux_configuracion_lote"))
+    except IntegrityError as e:
+        raise ErrorMigracion(
+            "Hay más de una fila en configuracion; deja solo la vigente antes de migrar"
+        ) from e
+
+    # El resumen es derivado: se recrea con la nueva clave y se recalcula
+    ResumenSalida.__table__.drop(conn, checkfirst=True)
+    ResumenSalida.__table__.create(conn)
+    resumen.reconstruir(conn)
+
+
+@migracion(8, "historial_salida.trabajador_id para conciliar cuadraturas")
+def _trabajador_en_salidas(conn):
+    _agregar_columnas(conn, HistorialSalida, "trabajador_id")
+
+
+@migracion(9, "Índice historial_salida (estacionamiento_id, patente) para /buscar")
+def _indice_patentes(conn):
+    _crear_indices(conn, _indice(HistorialSalida, "ix_historial_salida_lote_patente"))
+
+
+# ─────────────────────────────
+# Ejecución
+# ─────────────────────────────
+def version_actual(engine):
+    if not inspect(engine).has_table("esquema_version"):
+        return 0
+    with engine.connect() as conn:
+        fila = conn.execute(
+            esquema_version.select()
+            .order_by(esquema_version.c.version.desc())
+            .limit(1)
+        ).first()
+    return fila.version if fila else 0
+
+
+def aplicar(engine=None):
+    """Aplica las migraciones pendientes y devuelve la lista de las aplicadas."""
+    engine = engine or db.engine
+    _meta.create_all(engine)
+    actual = version_actual(engine)
+
+    aplicadas = []
+    for version, descripcion, fn in sorted(MIGRACIONES, key=lambda m: m[0]):
+        if version <= actual:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(
+                esquema_version.insert().values(
+                    version=version, descripcion=descripcion, aplicada=datetime.now()
+                )
+            )
+        aplicadas.append((version, descripcion))
+    return aplicadas
@@ -9,21 +9,54 @@ from sqlalchemy.orm import relationship
 
 db = SQLAlchemy()
 
+
+def columna_estacionamiento():
+    """FK al estacionamiento. Las filas anteriores a los multi‑estacionamientos
+    quedan en el 1 (también lo usan las peticiones que no indican uno)."""
+    return db.Column(
+        db.Integer, db.ForeignKey("estacionamientos.id"),
+        nullable=False, default=1, server_default="1",
+    )
+
+
+# ─────────────────────────────────────────────
+#  ESTACIONAMIENTOS
+#  - Un despliegue atiende varios estacionamientos
+#  - Plazas, vehículos, historial, cuadraturas y configuración
+#    llevan estacionamiento_id como primera columna de sus índices
+# ─────────────────────────────────────────────
+class Estacionamiento(db.Model):
+    __tablename__ = "estacionamientos"
+
+    id     = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(100), nullable=False)
+    creado = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
 # ─────────────────────────────────────────────
 #  NUEVA TABLA DE PLAZAS
 #  - Permite tener filas A, B, C…
-#  - Campo “codigo” único (A01, B05, etc.)
+#  - Campo “codigo” único por estacionamiento (A01, B05, etc.)
 #  - Relación 1‑a‑1 con Vehiculo
 # ─────────────────────────────────────────────
 class Plaza(db.Model):
     __tablename__ = "plazas"
 
     id      = db.Column(db.Integer, primary_key=True)
-    codigo  = db.Column(db.String(5), unique=True, nullable=False)  # Ej: "A01"
+    estacionamiento_id = columna_estacionamiento()
+    codigo  = db.Column(db.String(5), nullable=False)               # Ej: "A01"
     fila    = db.Column(db.String(1), nullable=False)               # "A", "B"…
     numero  = db.Column(db.Integer, nullable=False)                 # 1, 2, 3…
     ocupado = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.UniqueConstraint("estacionamiento_id", "codigo", name="uq_plazas_lote_codigo"),
+        # Búsqueda de la primera plaza libre y conteo de ocupadas, por estacionamiento
+        db.Index(
+            "ix_plazas_lote_ocupado_fila_numero",
+            "estacionamiento_id", "ocupado", "fila", "numero",
+        ),
+    )
+
     # Relación 1‑a‑1 con Vehiculo (uselist=False)
     vehiculo = db.relationship(
         "Vehiculo",
@@ -57,6 +90,21 @@ class Vehiculo(db.Model):
     # --- Relación con Plaza ---
     plaza_id = db.Column(db.Integer, db.ForeignKey("plazas.id"), nullable=False)
     plaza    = db.relationship("Plaza", back_populates="vehiculo")
+    estacionamiento_id = columna_estacionamiento()   # el mismo de la plaza
+
+    __table_args__ = (
+        # Una patente solo puede estar estacionada una vez por estacionamiento
+        db.Index(
+            "ux_vehiculos_lote_patente_activa",
+            "estacionamiento_id",
+            "patente",
+            unique=True,
+            sqlite_where=db.text("hora_salida IS NULL"),
+            postgresql_where=db.text("hora_salida IS NULL"),
+        ),
+        # Listado de estacionados (/historial, /cobros/preview)
+        db.Index("ix_vehiculos_lote_plaza", "estacionamiento_id", "plaza_id"),
+    )
 
     # Propiedad calculada (para código existente que use “posicion”)
     @property
@@ -91,10 +139,22 @@ class Usuario(db.Model):
 
 class Configuracion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    estacionamiento_id = columna_estacionamiento()   # una por estacionamiento
     nombre = db.Column(db.String(100))
     apertura = db.Column(db.String(5))  # Ej: "08:00"
     cierre = db.Column(db.String(5))    # Ej: "20:00"
-    tarifa = db.Column(db.Float)
+    tarifa = db.Column(db.Float)        # Por minuto
+
+    # Reglas de tarifa opcionales (ver tarifas.py)
+    primera_hora    = db.Column(db.Float)      # Precio fijo de los primeros 60 min
+    tope_diario     = db.Column(db.Float)      # Máximo por cada 24 h de estadía
+    tarifa_nocturna = db.Column(db.Float)      # Por minuto, entre noche_inicio y noche_fin
+    noche_inicio    = db.Column(db.String(5))  # Ej: "22:00"
+    noche_fin       = db.Column(db.String(5))  # Ej: "07:00"
+
+    __table_args__ = (
+        db.Index("ux_configuracion_lote", "estacionamiento_id", unique=True),
+    )
 
 
 
@@ -102,6 +162,7 @@ class Cuadratura(db.Model):
     __tablename__ = "cuadraturasv1"
 
     id = Column(Integer, primary_key=True)
+    estacionamiento_id = columna_estacionamiento()
     trabajador_id = Column(Integer, ForeignKey("usuarios.id"))
     fecha = Column(Date)
     jornada = Column(String)  # ← NUEVO CAMPO
@@ -110,9 +171,14 @@ class Cuadratura(db.Model):
 
     trabajador = relationship("Usuario")
 
+    __table_args__ = (
+        db.Index("ix_cuadraturas_lote_jornada", "estacionamiento_id", "jornada"),
+    )
+
 class HistorialSalida(db.Model):
     __tablename__ = "historial_salida"
     id = db.Column(db.Integer, primary_key=True)
+    estacionamiento_id = columna_estacionamiento()
     patente = db.Column(db.String(20), nullable=False)
     conductor = db.Column(db.String(100), nullable=False)
     correo = db.Column(db.String(120))
@@ -120,4 +186,89 @@ class HistorialSalida(db.Model):
     hora_salida = db.Column(db.DateTime, nullable=False, default=datetime.now)
     duracion_minutos = db.Column(db.Float, nullable=False)
     total_pagado = db.Column(db.Float, nullable=False)
-    posicion = db.Column(db.String(10), nullable=False)
\ No newline at end of file
+    posicion = db.Column(db.String(10), nullable=False)
+    # Quien cobró (token de la petición); None en salidas antiguas o sin sesión
+    trabajador_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"))
+
+    __table_args__ = (
+        # Filtros y orden por hora de salida (/salidas, estadísticas), por estacionamiento
+        db.Index(
+            "ix_historial_salida_lote_hora_salida", "estacionamiento_id", "hora_salida", "id"
+        ),
+        # /buscar: DISTINCT de patentes y visitas por patente sin leer la tabla
+        db.Index(
+            "ix_historial_salida_lote_patente", "estacionamiento_id", "patente", "hora_salida"
+        ),
+    )
+
+
+# ─────────────────────────────────────────────
+#  RESUMEN DE SALIDAS
+#  - Una fila por estacionamiento, día y hora de salida
+#  - Se actualiza en la misma transacción del cobro
+#  - Alimenta /estadisticas/salidas sin recorrer el historial
+# ─────────────────────────────────────────────
+class ResumenSalida(db.Model):
+    __tablename__ = "resumen_salidas"
+
+    estacionamiento_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    dia         = db.Column(db.Date, primary_key=True)
+    hora        = db.Column(db.Integer, primary_key=True)   # 0‑23
+    cantidad    = db.Column(db.Integer, nullable=False, default=0)
+    recaudacion = db.Column(db.Float, nullable=False, default=0)
+    minutos     = db.Column(db.Float, nullable=False, default=0)
+
+
+# ─────────────────────────────────────────────
+#  VERSIONES DE CACHÉ
+#  - Un contador por espacio ("plazas", "usuarios"…)
+#  - Cada escritura lo incrementa; los workers comparan
+#    su copia para saber si su caché local quedó vieja
+# ─────────────────────────────────────────────
+class VersionCache(db.Model):
+    __tablename__ = "cache_versiones"
+
+    espacio = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ─────────────────────────────────────────────
+#  EVENTOS DE OCUPACIÓN
+#  - Un registro por cambio de estado de una plaza
+#  - Los workers los leen para alimentar /plazas/stream
+#  - Se podan pasados unos minutos
+# ─────────────────────────────────────────────
+class EventoPlaza(db.Model):
+    __tablename__ = "eventos_plaza"
+
+    id      = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    estacionamiento_id = columna_estacionamiento()
+    codigo  = db.Column(db.String(5), nullable=False)
+    ocupado = db.Column(db.Boolean, nullable=False)
+    creado  = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+
+# ─────────────────────────────────────────────
+#  TRABAJOS EN SEGUNDO PLANO
+#  - Cola durable: los handlers insertan en su misma transacción
+#  - El proceso `flask --app app trabajador` los ejecuta
+#  - Reintentos con espera exponencial (disponible_en)
+# ─────────────────────────────────────────────
+class Trabajo(db.Model):
+    __tablename__ = "trabajos"
+
+    id            = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tipo          = db.Column(db.String(30), nullable=False)     # "recibo", "webhook"
+    datos         = db.Column(db.Text, nullable=False)          # JSON
+    estado        = db.Column(db.String(15), nullable=False, default="pendiente")
+    intentos      = db.Column(db.Integer, nullable=False, default=0)
+    error         = db.Column(db.Text)
+    creado        = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    disponible_en = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    tomado        = db.Column(db.DateTime)
+    terminado     = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # El trabajador busca pendientes ya disponibles, en orden de llegada
+        db.Index("ix_trabajos_estado_disponible", "estado", "disponible_en", "id"),
+    )
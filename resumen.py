@@ -0,0 +1,85 @@
+# resumen.py
+from collections import defaultdict
+from itertools import chain
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import HistorialSalida, ResumenSalida
+
+
+# ─────────────────────────────────────────────
+#  RESUMEN POR DÍA / HORA DE LAS SALIDAS
+#  - Por estacionamiento
+#  - acumular(): suma salidas nuevas (dentro de la transacción del cobro)
+#  - reconstruir(): recalcula todo desde historial_salida (y lo archivado)
+# ─────────────────────────────────────────────
+_tabla = ResumenSalida.__table__
+
+
+def _dialecto(ejecutor):
+    """Acepta tanto una Session como una Connection."""
+    if hasattr(ejecutor, "dialect"):
+        return ejecutor.dialect.name
+    return ejecutor.get_bind().dialect.name
+
+
+def _agrupar(salidas):
+    """salidas: iterable de (estacionamiento_id, hora_salida, total_pagado, duracion_minutos)."""
+    grupos = defaultdict(lambda: [0, 0.0, 0.0])
+    for lote, hora_salida, total, minutos in salidas:
+        g = grupos[(lote, hora_salida.date(), hora_salida.hour)]
+        g[0] += 1
+        g[1] += total or 0
+        g[2] += minutos or 0
+    return [
+        {"estacionamiento_id": lote, "dia": dia, "hora": hora,
+         "cantidad": c, "recaudacion": r, "minutos": m}
+        for (lote, dia, hora), (c, r, m) in grupos.items()
+    ]
+
+
+def acumular(ejecutor, salidas, estacionamiento_id):
+    """Suma las salidas al resumen con un upsert por (estacionamiento, dia, hora).
+
+    salidas: iterable de (hora_salida, total_pagado, duracion_minutos).
+    """
+    filas = _agrupar((estacionamiento_id, *s) for s in salidas)
+    if not filas:
+        return
+    dialecto = _dialecto(ejecutor)
+    if dialecto == "postgresql":
+        stmt = postgresql.insert(_tabla)
+    elif dialecto == "sqlite":
+        stmt = sqlite.insert(_tabla)
+    else:
+        raise NotImplementedError(f"Upsert no soportado para {dialecto}")
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_tabla.c.estacionamiento_id, _tabla.c.dia, _tabla.c.hora],
+        set_={
+            "cantidad": _tabla.c.cantidad + stmt.excluded.cantidad,
+            "recaudacion": _tabla.c.recaudacion + stmt.excluded.recaudacion,
+            "minutos": _tabla.c.minutos + stmt.excluded.minutos,
+        },
+    )
+    ejecutor.execute(stmt, filas)
+
+
+def reconstruir(conn, lote=5000, archivadas=()):
+    """Borra el resumen y lo vuelve a calcular recorriendo el historial una vez.
+
+    archivadas: salidas que ya no están en la tabla, en el formato de _agrupar().
+    """
+    conn.execute(delete(_tabla))
+    resultado = conn.execute(
+        select(
+            HistorialSalida.estacionamiento_id,
+            HistorialSalida.hora_salida,
+            HistorialSalida.total_pagado,
+            HistorialSalida.duracion_minutos,
+        ).execution_options(yield_per=lote)
+    )
+    filas = _agrupar(chain(archivadas, resultado))
+    if filas:
+        conn.execute(insert(_tabla), filas)
+    return len(filas)
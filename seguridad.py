@@ -0,0 +1,103 @@
+# seguridad.py
+import hashlib
+import os
+import secrets
+
+from flask import current_app, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import db, Usuario
+
+try:
+    from gevent import get_hub
+    from gevent.monkey import is_module_patched
+except ImportError:      # desarrollo local sin gevent
+    get_hub = None
+
+
+# ─────────────────────────────────────────────
+#  SESIONES Y CONTRASEÑAS
+#  - /login emite un token firmado con vencimiento
+#  - El token reemplaza a la contraseña en las rutas que la pedían
+#  - El hash (scrypt/pbkdf2) corre en el hilo de la petición: hashlib
+#    libera el GIL, así que los logins simultáneos no se bloquean entre sí.
+#    Bajo el worker gevent va al threadpool del hub, que sí es un hilo
+#    real, para no frenar el loop (y con él los streams abiertos)
+#  - SECRET_KEY es obligatoria fuera de modo debug: con varias instancias
+#    o disco efímero una clave local invalidaría los tokens
+# ─────────────────────────────────────────────
+def init_app(app):
+    if app.config.get("SECRET_KEY"):
+        return
+    if not (app.debug or app.testing):
+        raise RuntimeError(
+            "Falta SECRET_KEY: defínala en el entorno (la misma en todas las instancias)"
+        )
+    app.config["SECRET_KEY"] = _clave_de_instancia(app)
+    app.logger.warning(
+        "SECRET_KEY no definida: se usa %s (solo para desarrollo local)",
+        os.path.join(app.instance_path, "secret_key"),
+    )
+
+
+def _clave_de_instancia(app):
+    """Clave compartida por los workers de esta máquina (solo desarrollo)."""
+    ruta = os.path.join(app.instance_path, "secret_key")
+    os.makedirs(app.instance_path, exist_ok=True)
+    try:
+        with open(os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+            f.write(secrets.token_hex(32))
+    except FileExistsError:
+        pass
+    with open(ruta) as f:
+        return f.read().strip()
+
+
+# ------ contraseñas ------
+def _hash(fn, *args):
+    if get_hub is not None and is_module_patched("threading"):
+        return get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+def verificar_contraseña(usuario, contraseña):
+    if not contraseña:
+        return False
+    return _hash(check_password_hash, usuario.contraseña_hash, contraseña)
+
+
+def asignar_contraseña(usuario, contraseña):
+    usuario.contraseña_hash = _hash(generate_password_hash, contraseña)
+
+
+# ------ tokens ------
+def _serializador():
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt="sesion")
+
+
+def _huella(usuario):
+    # Cambiar la contraseña invalida los tokens emitidos antes
+    return hashlib.sha256(usuario.contraseña_hash.encode()).hexdigest()[:16]
+
+
+def emitir_token(usuario):
+    return _serializador().dumps({"uid": usuario.id, "h": _huella(usuario)})
+
+
+def usuario_del_token():
+    """Usuario del header ``Authorization: Bearer <token>``, o None si no es válido."""
+    cabecera = request.headers.get("Authorization", "")
+    if not cabecera.startswith("Bearer "):
+        return None
+    try:
+        datos = _serializador().loads(
+            cabecera[len("Bearer "):],
+            max_age=current_app.config["TOKEN_EXPIRA_SEGUNDOS"],
+        )
+    except BadSignature:   # incluye SignatureExpired
+        return None
+    usuario = db.session.get(Usuario, datos.get("uid"))
+    if usuario is None or _huella(usuario) != datos.get("h"):
+        return None
+    return usuario
@@ -0,0 +1,43 @@
+# serializacion.py
+import json
+
+from flask import Response
+
+
+# ─────────────────────────────────────────────
+#  SERIALIZACIÓN DE LISTADOS
+#  - Las rutas de listado proyectan columnas (sin objetos ORM)
+#  - proyectar() convierte esas filas en dicts
+#  - respuesta_json() arma la respuesta con json.dumps compacto
+# ─────────────────────────────────────────────
+def iso(valor):
+    return valor.isoformat(timespec="seconds") if valor is not None else None
+
+
+def dos_decimales(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+def proyectar(filas, campos):
+    """filas: tuplas/Row en el orden de ``campos``.
+
+    campos: secuencia de (nombre, conversion) donde conversion puede ser None.
+    Las columnas que sobran al final de la fila se ignoran.
+    """
+    nombres = [n for n, _ in campos]
+    conversiones = [(i, f) for i, (_, f) in enumerate(campos) if f is not None]
+    resultado = []
+    for fila in filas:
+        valores = list(fila)
+        for i, f in conversiones:
+            valores[i] = f(valores[i])
+        resultado.append(dict(zip(nombres, valores)))
+    return resultado
+
+
+def dumps(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":"))
+
+
+def respuesta_json(datos, estado=200):
+    return Response(dumps(datos), status=estado, mimetype="application/json")
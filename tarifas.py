@@ -0,0 +1,99 @@
+# tarifas.py
+from itertools import accumulate
+
+MINUTOS_DIA = 1440
+
+
+# ─────────────────────────────────────────────
+#  MOTOR DE TARIFAS
+#  - Reglas: tarifa por minuto, tarifa nocturna, precio de la
+#    primera hora y tope por cada 24 h de estadía
+#  - compilar() las convierte en una tabla por minuto del día y su
+#    suma acumulada; cotizar es aritmética (sin recorrer minutos)
+#  - La instancia compilada se cachea por versión de configuración
+# ─────────────────────────────────────────────
+def minuto_del_dia(hora):
+    """'HH:MM' → minutos desde medianoche. ValueError si el formato no sirve."""
+    if not isinstance(hora, str):
+        raise ValueError(f"Hora inválida: {hora!r}")
+    h, m = hora.split(":")
+    h, m = int(h), int(m)
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise ValueError(f"Hora inválida: {hora}")
+    return h * 60 + m
+
+
+class Tarifario:
+    def __init__(self, tarifa, tarifa_nocturna=None, noche_inicio=None, noche_fin=None,
+                 primera_hora=None, tope_diario=None):
+        por_minuto = [float(tarifa)] * MINUTOS_DIA
+        if tarifa_nocturna is not None and noche_inicio and noche_fin:
+            inicio, fin = minuto_del_dia(noche_inicio), minuto_del_dia(noche_fin)
+            # La noche puede cruzar la medianoche (22:00 → 07:00)
+            if fin <= inicio:
+                fin += MINUTOS_DIA
+            for m in range(inicio, fin):
+                por_minuto[m % MINUTOS_DIA] = float(tarifa_nocturna)
+        self.por_minuto = por_minuto
+        self.acumulado = [0.0] + list(accumulate(por_minuto))
+        self.dia = self.acumulado[-1]
+        self.primera_hora = float(primera_hora) if primera_hora is not None else None
+        self.tope = float(tope_diario) if tope_diario is not None else None
+
+    def _F(self, x):
+        """Costo acumulado desde la medianoche del día de entrada hasta el minuto x."""
+        dias, resto = divmod(x, MINUTOS_DIA)
+        entero = int(resto)
+        return (
+            dias * self.dia
+            + self.acumulado[entero]
+            + (resto - entero) * self.por_minuto[entero]
+        )
+
+    def _tramo(self, desde, hasta):
+        return self._F(hasta) - self._F(desde)
+
+    def _bloque(self, inicio, largo, primero):
+        """Costo de un bloque de hasta 24 h que empieza en el minuto ``inicio``."""
+        if primero and self.primera_hora is not None:
+            costo = self.primera_hora + (
+                self._tramo(inicio + 60, inicio + largo) if largo > 60 else 0.0
+            )
+        else:
+            costo = self._tramo(inicio, inicio + largo)
+        return min(costo, self.tope) if self.tope is not None else costo
+
+    def cotizar(self, hora_entrada, ahora):
+        """(minutos, total redondeado) de una estadía."""
+        minutos = max((ahora - hora_entrada).total_seconds() / 60, 0.0)
+        inicio = (
+            hora_entrada.hour * 60 + hora_entrada.minute
+            + (hora_entrada.second + hora_entrada.microsecond / 1e6) / 60
+        )
+        completos, resto = divmod(minutos, MINUTOS_DIA)
+        completos = int(completos)
+        if completos == 0:
+            total = self._bloque(inicio, minutos, primero=True)
+        else:
+            # Un bloque completo cubre todos los minutos del día: cuesta lo mismo
+            # salvo el primero (primera hora); el último puede quedar parcial.
+            total = self._bloque(inicio, MINUTOS_DIA, primero=True)
+            if completos > 1:
+                total += (completos - 1) * self._bloque(inicio, MINUTOS_DIA, primero=False)
+            if resto:
+                total += self._bloque(inicio + completos * MINUTOS_DIA, resto, primero=False)
+        return minutos, round(total, 0)
+
+
+def compilar(config, tarifa_defecto):
+    """Tarifario desde el dict de configuración (None o campos vacíos → defecto)."""
+    config = config or {}
+    tarifa = config.get("tarifa")
+    return Tarifario(
+        tarifa if tarifa is not None else tarifa_defecto,
+        tarifa_nocturna=config.get("tarifa_nocturna"),
+        noche_inicio=config.get("noche_inicio"),
+        noche_fin=config.get("noche_fin"),
+        primera_hora=config.get("primera_hora"),
+        tope_diario=config.get("tope_diario"),
+    )
@@ -0,0 +1,28 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# La app lee la configuración al importarse: BD temporal antes del primer import
+_CARPETA = tempfile.mkdtemp(prefix="test_miestaciona_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_CARPETA, 'test.db')}"
+os.environ["ARCHIVO_DIR"] = os.path.join(_CARPETA, "archivo")
+os.environ["METRICAS_DIR"] = os.path.join(_CARPETA, "metricas")
+os.environ.setdefault("SECRET_KEY", "pruebas")
+os.environ["CACHE_TTL_SEGUNDOS"] = "0"
+# Las versiones de caché se releen solo al invalidar en este proceso: si no,
+# una consulta extra aparecería o no según el tiempo entre peticiones
+os.environ["CACHE_INTERVALO_VERSION"] = "3600"
+os.environ["BUSQUEDA_REFRESCO_SEGUNDOS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app, preparar_base
+
+    with app.app_context():
+        preparar_base()
+    return app
@@ -0,0 +1,170 @@
+# tests/test_archivo.py
+"""`flask archivar`: las rutas responden lo mismo antes y después de archivar."""
+import shutil
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from benchmarks.datos import generar
+
+RUTAS = [
+    "/salidas",
+    "/salidas?patente=ZZZZ99",
+    "/salidas/export?formato=csv",
+    "/salidas/export?formato=ndjson",
+]
+
+
+@pytest.fixture
+def datos(app, monkeypatch):
+    import archivo
+    from app import archivo_salidas, cache
+
+    shutil.rmtree(archivo_salidas.directorio, ignore_errors=True)
+    # Bloques chicos: cada mes queda en varios miembros gzip
+    monkeypatch.setattr(archivo, "BLOQUE_FILAS", 100)
+    generar(app, plazas=50, historial=3000, usuarios=3, dias=200)
+    cache.limpiar()
+    yield
+    shutil.rmtree(archivo_salidas.directorio, ignore_errors=True)
+
+
+def filas_en_tabla(app):
+    from models import db, HistorialSalida
+
+    with app.app_context():
+        return db.session.execute(select(func.count(HistorialSalida.id))).scalar()
+
+
+def archivar(app):
+    resultado = app.test_cli_runner().invoke(args=["archivar", "--meses", "2"])
+    assert resultado.exit_code == 0, resultado.output
+    return resultado.output
+
+
+def paginas(cliente, limite=97):
+    """Recorre /salidas por cursor y devuelve todas las filas en orden."""
+    filas, ruta = [], f"/salidas?limite={limite}"
+    while True:
+        cuerpo = cliente.get(ruta).get_json()
+        filas += cuerpo["salidas"]
+        if not cuerpo["siguiente"]:
+            return filas
+        ruta = f"/salidas?limite={limite}&cursor={cuerpo['siguiente']}"
+
+
+def foto(app):
+    """Respuestas a comparar. /estadisticas/ocupacion queda fuera: desde el
+    archivo se calcula en Python y difiere de julianday en el redondeo."""
+    from app import cache
+
+    cache.limpiar()
+    hoy = date.today()
+    desde = hoy - timedelta(days=180)
+    rutas = RUTAS + [
+        f"/salidas/export?formato=csv&desde={desde}&hasta={desde + timedelta(days=20)}",
+        f"/cuadratura/reconciliacion?desde={desde}&hasta={desde + timedelta(days=90)}",
+    ] + [
+        f"/estadisticas/salidas?modo=anio&inicio={anio}-01-01"
+        for anio in {desde.year, hoy.year}
+    ]
+    with app.test_client() as cliente:
+        resultado = {ruta: cliente.get(ruta).get_data() for ruta in rutas}
+        resultado["paginas"] = paginas(cliente)
+    return resultado
+
+
+def test_rutas_iguales_tras_archivar(app, datos):
+    from app import archivo_salidas
+
+    antes = foto(app)
+    total = filas_en_tabla(app)
+    archivar(app)
+    assert filas_en_tabla(app) < total
+    assert any(len(s["bloques"]) > 1 for s in archivo_salidas.indice())
+
+    despues = foto(app)
+    assert len(despues["paginas"]) == total
+    for ruta in antes:
+        assert despues[ruta] == antes[ruta], ruta
+
+
+def test_segunda_corrida_no_hace_nada(app, datos):
+    from app import archivo_salidas
+
+    archivar(app)
+    restantes = filas_en_tabla(app)
+    indice = archivo_salidas.indice()
+
+    assert "0 segmentos" in archivar(app)
+    assert filas_en_tabla(app) == restantes
+    assert archivo_salidas.indice() == indice
+
+
+def test_corte_a_mitad_de_mes_fusiona(app, datos, monkeypatch):
+    import archivo
+    from app import archivo_salidas
+    from models import db, HistorialSalida
+
+    borrar = archivo.delete
+    cortes = []
+
+    def delete_que_falla(*args):
+        # La primera vez se corta tras escribir segmento e índice, antes del borrado
+        if not cortes:
+            cortes.append(1)
+            raise RuntimeError("corte")
+        return borrar(*args)
+
+    antes = foto(app)
+    monkeypatch.setattr(archivo, "delete", delete_que_falla)
+    resultado = app.test_cli_runner().invoke(args=["archivar", "--meses", "2"])
+    assert isinstance(resultado.exception, RuntimeError)
+    (segmento,) = archivo_salidas.indice()
+    mes = datetime.strptime(segmento["mes"], "%Y-%m")
+    fin = (mes + timedelta(days=32)).replace(day=1)
+
+    # El mes quedó en el archivo y en la tabla; llega otra salida del mismo mes
+    with app.app_context():
+        en_mes = (HistorialSalida.hora_salida >= mes, HistorialSalida.hora_salida < fin)
+        ids = set(db.session.execute(select(HistorialSalida.id).where(*en_mes)).scalars())
+        assert ids == {f["id"] for f in archivo_salidas.filas(segmento)}
+        modelo = db.session.execute(
+            select(HistorialSalida).where(*en_mes).order_by(HistorialSalida.hora_salida)
+        ).scalars().first()
+        extra = HistorialSalida(
+            patente="CORTE1", conductor="c", hora_entrada=modelo.hora_entrada,
+            hora_salida=modelo.hora_salida, duracion_minutos=modelo.duracion_minutos,
+            total_pagado=modelo.total_pagado, posicion=modelo.posicion,
+        )
+        db.session.add(extra)
+        db.session.commit()
+        ids.add(extra.id)
+
+    archivar(app)
+    fusionado = next(
+        s for s in archivo_salidas.indice() if s["archivo"] == segmento["archivo"]
+    )
+    archivadas = [f["id"] for f in archivo_salidas.filas(fusionado)]
+    assert sorted(archivadas) == sorted(ids)
+    assert fusionado["filas"] == len(ids)
+    with app.app_context():
+        assert not db.session.execute(
+            select(func.count(HistorialSalida.id)).where(*en_mes)
+        ).scalar()
+
+    # Sin la fila agregada, todo lo demás responde igual que antes del corte
+    despues = foto(app)
+    assert [f for f in despues["paginas"] if f["patente"] != "CORTE1"] == antes["paginas"]
+
+
+def test_sin_archivo_dir_no_archiva(app, datos, monkeypatch):
+    from app import archivo_salidas
+
+    total = filas_en_tabla(app)
+    monkeypatch.setattr(archivo_salidas, "directorio", None)
+    resultado = app.test_cli_runner().invoke(args=["archivar", "--meses", "0"])
+    assert resultado.exit_code != 0
+    assert "ARCHIVO_DIR" in resultado.output
+    assert filas_en_tabla(app) == total
@@ -0,0 +1,93 @@
+# tests/test_asignador.py
+"""AsignadorPlazas: reclamar, liberar, recargar y dos workers por la última plaza."""
+import threading
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from asignador import AsignadorPlazas
+from models import db, HistorialSalida, Plaza, Vehiculo
+
+
+@pytest.fixture
+def plazas(app):
+    """Tres plazas libres A01..A03 en el estacionamiento 1."""
+    with app.app_context():
+        for modelo in (Vehiculo, HistorialSalida, Plaza):
+            db.session.execute(delete(modelo))
+        db.session.add_all(
+            Plaza(codigo=f"A{n:02d}", fila="A", numero=n, ocupado=False) for n in (3, 1, 2)
+        )
+        db.session.commit()
+        yield
+
+
+def ocupadas():
+    return set(db.session.scalars(select(Plaza.codigo).where(Plaza.ocupado == True)))
+
+
+def test_reclamar_en_orden_hasta_llenar(plazas):
+    asignador = AsignadorPlazas()
+    assert [p.codigo for p in asignador.reclamar(2)] == ["A01", "A02"]
+    assert [p.codigo for p in asignador.reclamar(2)] == ["A03"]
+    assert asignador.reclamar() == []
+    db.session.commit()
+    assert ocupadas() == {"A01", "A02", "A03"}
+
+
+def test_liberar_devuelve_la_plaza(plazas):
+    asignador = AsignadorPlazas()
+    (a01, a02) = asignador.reclamar(2)
+    # Como una salida: la BD primero y después el heap
+    a01.ocupado = False
+    db.session.commit()
+    asignador.liberar(a01.id, a01.fila, a01.numero)
+    asignador.liberar(a01.id, a01.fila, a01.numero)   # repetido no duplica
+    assert [p.codigo for p in asignador.reclamar(3)] == ["A01", "A03"]
+    db.session.commit()
+    assert ocupadas() == {"A01", "A02", "A03"}
+
+
+def test_recargar_ve_lo_que_libero_otro_worker(plazas):
+    asignador = AsignadorPlazas(refresco_segundos=3600)
+    asignador.reclamar(3)
+    db.session.commit()
+    # Otro worker libera A02 en la BD: este heap no se enteró
+    db.session.execute(update(Plaza).where(Plaza.codigo == "A02").values(ocupado=False))
+    db.session.commit()
+    assert [p.codigo for p in asignador.reclamar()] == ["A02"]
+
+    # Con el heap desfasado (otro worker ocupó todo) no reclama ninguna
+    db.session.execute(update(Plaza).values(ocupado=False))
+    db.session.commit()
+    asignador.recargar()
+    assert len(AsignadorPlazas().reclamar(3)) == 3
+    db.session.commit()
+    assert asignador.reclamar() == []
+
+
+def test_dos_workers_por_la_ultima_plaza(app, plazas):
+    db.session.execute(update(Plaza).where(Plaza.codigo != "A02").values(ocupado=True))
+    db.session.commit()
+    listos = threading.Barrier(2)
+    resultados = {}
+
+    def worker(nombre):
+        with app.app_context():
+            asignador = AsignadorPlazas(refresco_segundos=3600)
+            asignador.recargar()
+            db.session.commit()
+            listos.wait()
+            resultados[nombre] = [p.codigo for p in asignador.reclamar()]
+            db.session.commit()
+
+    hilos = [threading.Thread(target=worker, args=(n,)) for n in ("a", "b")]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    # Los dos veían A02 libre en su heap; el UPDATE condicional deja uno solo
+    assert sorted(resultados.values()) == [[], ["A02"]]
+    db.session.expire_all()
+    assert ocupadas() == {"A01", "A02", "A03"}
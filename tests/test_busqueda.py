@@ -0,0 +1,58 @@
+# tests/test_busqueda.py
+"""IndicePatentes.aproximadas encuentra lo mismo que comparar contra cada patente."""
+import random
+
+import pytest
+
+from busqueda import IndicePatentes, distancia
+
+# Alfabeto chico: muchas patentes vecinas y prefijos compartidos
+ALFABETO = "ABCD0123"
+
+
+def _patente(rng):
+    return "".join(rng.choices(ALFABETO, k=rng.choice((1, 2, 2, 3, 4, 5, 6, 6, 7, 8))))
+
+
+def _variante(rng, patente):
+    """Hasta dos ediciones al azar: borrar, insertar o cambiar un carácter."""
+    for _ in range(rng.randint(0, 2)):
+        i = rng.randint(0, len(patente))
+        operacion = rng.choice("bic") if patente else "i"
+        if operacion == "b" and i < len(patente):
+            patente = patente[:i] + patente[i + 1:]
+        elif operacion == "c" and i < len(patente):
+            patente = patente[:i] + rng.choice(ALFABETO) + patente[i + 1:]
+        else:
+            patente = patente[:i] + rng.choice(ALFABETO) + patente[i:]
+    return patente
+
+
+@pytest.fixture(scope="module")
+def indice():
+    rng = random.Random(20)
+    indice = IndicePatentes()
+    indice._claves = sorted(indice._cargar(_patente(rng) for _ in range(300)))
+    indice._invertidas = sorted(c[::-1] for c in indice._claves)
+    return indice
+
+
+def _consultas(indice):
+    rng = random.Random(21)
+    return (
+        list(indice._claves)
+        + [_variante(rng, clave) for clave in rng.sample(indice._claves, 150)]
+        + [_patente(rng) for _ in range(150)]
+        + ["", "A", "0", "AB", "D3"]
+    )
+
+
+@pytest.mark.parametrize("maximo", [0, 1, 2])
+def test_aproximadas_igual_a_fuerza_bruta(indice, maximo):
+    assert any(len(c) < 3 for c in indice._claves)
+    for consulta in _consultas(indice):
+        esperado = sorted(
+            (d, clave) for clave in indice._claves
+            if (d := distancia(consulta, clave, maximo)) <= maximo
+        )
+        assert sorted(indice.aproximadas(consulta, maximo)) == esperado, consulta
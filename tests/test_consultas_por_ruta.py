@@ -0,0 +1,45 @@
+# tests/test_consultas_por_ruta.py
+"""Cantidad de SQL por ruta: acotada y sin crecer con el tamaño de las tablas (N+1)."""
+import pytest
+
+from benchmarks.consultas_por_ruta import cargar, consultas
+
+# Máximo de sentencias por petición, contando las del cuerpo en stream
+LIMITES = {
+    "/historial": 2,
+    "/salidas": 1,
+    "/salidas?limite=50": 1,
+    "/salidas/export?formato=csv": 1,
+    "/salidas/export?formato=ndjson&gzip=1": 1,
+    "/usuarios": 2,
+    "/plazas": 2,
+    "/estadisticas": 3,
+    "/buscar?q=V0001": 3,
+}
+
+
+@pytest.fixture(scope="module")
+def medidas(app):
+    from app import cache
+
+    resultado = {}
+    for n in (20, 200):
+        cargar(app, n)
+        cache.limpiar()
+        with app.test_client() as cliente:
+            # Primera pasada descartada: carga índices en memoria (/buscar)
+            for ruta in LIMITES:
+                consultas(app, cliente, ruta)
+            resultado[n] = {ruta: consultas(app, cliente, ruta) for ruta in LIMITES}
+    return resultado
+
+
+@pytest.mark.parametrize("ruta", LIMITES)
+def test_consultas_acotadas(medidas, ruta):
+    for n, por_ruta in medidas.items():
+        assert 0 < por_ruta[ruta] <= LIMITES[ruta], (n, por_ruta[ruta])
+
+
+@pytest.mark.parametrize("ruta", LIMITES)
+def test_consultas_no_crecen(medidas, ruta):
+    assert medidas[20][ruta] == medidas[200][ruta]
@@ -0,0 +1,26 @@
+# tests/test_metricas.py
+"""/metrics solo suma (y cuenta) los archivos de workers vivos."""
+import json
+import os
+import subprocess
+import sys
+
+import metricas
+
+
+def test_descarta_workers_terminados(app):
+    directorio = app.config["METRICAS_DIR"]
+    os.makedirs(directorio, exist_ok=True)
+    terminado = subprocess.Popen([sys.executable, "-c", "pass"])
+    terminado.wait()
+    muerto = os.path.join(directorio, f"{terminado.pid}.json")
+    with open(muerto, "w") as f:
+        json.dump({"sql_segundos": {"/muerto": 1.0}}, f)
+
+    metricas.volcar(app)
+    total, workers = metricas.agregado(app)
+
+    assert workers == 1
+    assert "/muerto" not in total["sql_segundos"]
+    assert not os.path.exists(muerto)
+    assert os.path.exists(os.path.join(directorio, f"{os.getpid()}.json"))
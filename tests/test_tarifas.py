@@ -0,0 +1,54 @@
+# tests/test_tarifas.py
+"""Totales exactos de tarifas.cotizar."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import tarifas
+
+LUNES = datetime(2026, 3, 2)
+
+
+def cotizar(tarifario, entrada, minutos):
+    return tarifario.cotizar(entrada, entrada + timedelta(minutes=minutos))
+
+
+def test_estadia_de_cero_minutos():
+    assert cotizar(tarifas.Tarifario(50), LUNES.replace(hour=10), 0) == (0.0, 0)
+    # Con precio de primera hora se cobra igual la primera hora
+    con_primera = tarifas.Tarifario(50, primera_hora=1000)
+    assert cotizar(con_primera, LUNES.replace(hour=10), 0) == (0.0, 1000)
+
+
+def test_cruza_la_medianoche():
+    entrada = LUNES.replace(hour=23, minute=30)
+    assert cotizar(tarifas.Tarifario(50), entrada, 60) == (60.0, 3000)
+
+
+def test_primera_hora():
+    entrada = LUNES.replace(hour=10)
+    assert cotizar(tarifas.Tarifario(50, primera_hora=1000), entrada, 90) == (90.0, 2500)
+
+
+@pytest.mark.parametrize("hora, minutos, total", [
+    (21, 120, 60 * 50 + 60 * 20),                 # entra de día, sale de noche
+    (6, 120, 60 * 20 + 60 * 50),                  # la noche termina a las 07:00
+    (21, 11 * 60, 60 * 50 + 9 * 60 * 20 + 60 * 50),   # 21:00 → 08:00 del día siguiente
+])
+def test_cruza_la_ventana_nocturna(hora, minutos, total):
+    tarifario = tarifas.Tarifario(50, tarifa_nocturna=20, noche_inicio="22:00", noche_fin="07:00")
+    assert cotizar(tarifario, LUNES.replace(hour=hora), minutos) == (float(minutos), total)
+
+
+def test_tope_diario_en_varios_dias():
+    tarifario = tarifas.Tarifario(50, primera_hora=1000, tope_diario=20000)
+    entrada = LUNES.replace(hour=10)
+    # Dos bloques de 24 h topados y 2 h más sin llegar al tope
+    assert cotizar(tarifario, entrada, 2 * 1440 + 120) == (2 * 1440 + 120.0, 2 * 20000 + 120 * 50)
+    # El bloque final parcial también se topa
+    assert cotizar(tarifario, entrada, 3 * 1440 + 600) == (3 * 1440 + 600.0, 4 * 20000)
+
+
+def test_compilar_rechaza_horas_que_no_son_texto():
+    with pytest.raises(ValueError):
+        tarifas.compilar({"tarifa_nocturna": 20, "noche_inicio": 2200, "noche_fin": "07:00"}, 50)
@@ -0,0 +1,250 @@
+# trabajos.py
+import json
+import smtplib
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+
+from models import db, Trabajo
+import metricas
+
+
+# ─────────────────────────────────────────────
+#  COLA DE TRABAJOS
+#  - encolar(): inserta en la transacción del handler (si el cobro
+#    hace rollback, el recibo tampoco existe)
+#  - El trabajador toma lotes con un UPDATE condicional, así varios
+#    procesos pueden correr a la vez sin ejecutar dos veces lo mismo
+#  - Si falla, reintenta con espera exponencial; si un trabajador muere
+#    a mitad, el trabajo vuelve a estar disponible tras un tiempo
+# ─────────────────────────────────────────────
+PENDIENTE, EN_CURSO, HECHO, FALLIDO = "pendiente", "en_curso", "hecho", "fallido"
+ESTADOS = (PENDIENTE, EN_CURSO, HECHO, FALLIDO)
+
+MANEJADORES = {}
+_poda = {"ultima": 0.0}
+
+
+def manejador(tipo):
+    def registrar(fn):
+        MANEJADORES[tipo] = fn
+        return fn
+    return registrar
+
+
+def encolar(tipo, *datos):
+    """Agrega un trabajo por cada dict de ``datos``. No hace commit."""
+    ahora = datetime.now()
+    filas = [
+        {"tipo": tipo, "datos": json.dumps(d, ensure_ascii=False, default=str),
+         "estado": PENDIENTE, "intentos": 0, "creado": ahora, "disponible_en": ahora}
+        for d in datos
+    ]
+    if filas:
+        db.session.execute(insert(Trabajo), filas)
+
+
+# ─────────────────────────────
+# Manejadores
+# ─────────────────────────────
+@manejador("recibo")
+def enviar_recibo(app, datos):
+    """Correo con el detalle del cobro. Para probar en local basta un SMTP de
+    prueba (p. ej. ``python -m aiosmtpd -n -l localhost:1025``) y SMTP_PORT=1025."""
+    mensaje = EmailMessage()
+    mensaje["Subject"] = f"Recibo de estacionamiento {datos['patente']}"
+    mensaje["From"] = app.config["SMTP_REMITENTE"]
+    mensaje["To"] = datos["correo"]
+    mensaje.set_content(
+        f"Patente: {datos['patente']}\n"
+        f"Plaza: {datos.get('posicion') or '-'}\n"
+        f"Entrada: {datos['entrada']}\n"
+        f"Salida: {datos['salida']}\n"
+        f"Minutos: {datos['minutos']}\n"
+        f"Total: ${datos['total']:,.0f}\n"
+    )
+    with smtplib.SMTP(app.config["SMTP_HOST"], app.config["SMTP_PORT"], timeout=15) as smtp:
+        if app.config["SMTP_TLS"]:
+            smtp.starttls()
+        if app.config["SMTP_USUARIO"]:
+            smtp.login(app.config["SMTP_USUARIO"], app.config["SMTP_CONTRASEÑA"])
+        smtp.send_message(mensaje)
+
+
+@manejador("webhook")
+def enviar_webhook(app, datos):
+    req = urllib.request.Request(
+        app.config["WEBHOOK_URL"],
+        data=json.dumps(datos, ensure_ascii=False).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    # urlopen lanza HTTPError con 4xx/5xx y el trabajo se reintenta
+    with urllib.request.urlopen(req, timeout=15) as r:
+        r.read()
+
+
+# ─────────────────────────────
+# Trabajador
+# ─────────────────────────────
+def _disponibles(ahora, visibilidad):
+    return or_(
+        and_(Trabajo.estado == PENDIENTE, Trabajo.disponible_en <= ahora),
+        # Tomado por un trabajador que no terminó (murió o se colgó)
+        and_(Trabajo.estado == EN_CURSO,
+             Trabajo.tomado < ahora - timedelta(seconds=visibilidad)),
+    )
+
+
+def tomar(app, limite):
+    """Reclama hasta ``limite`` trabajos. Devuelve filas (id, tipo, datos, intentos, creado)."""
+    ahora = datetime.now()
+    condicion = _disponibles(ahora, app.config["TRABAJOS_VISIBILIDAD_SEGUNDOS"])
+    candidatos = db.session.scalars(
+        select(Trabajo.id).where(condicion).order_by(Trabajo.id).limit(limite)
+    ).all()
+    if not candidatos:
+        db.session.rollback()
+        return []
+    # Se repite la condición: si otro trabajador ganó la carrera, la fila no vuelve
+    tomados = db.session.execute(
+        update(Trabajo)
+        .where(Trabajo.id.in_(candidatos), condicion)
+        .values(estado=EN_CURSO, tomado=ahora, intentos=Trabajo.intentos + 1)
+        .returning(Trabajo.id, Trabajo.tipo, Trabajo.datos, Trabajo.intentos, Trabajo.creado)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return sorted(tomados, key=lambda t: t.id)
+
+
+def _espera(app, intentos):
+    base = app.config["TRABAJOS_ESPERA_SEGUNDOS"]
+    return min(base * 2 ** (intentos - 1), app.config["TRABAJOS_ESPERA_MAX_SEGUNDOS"])
+
+
+def ejecutar(app, trabajo):
+    try:
+        fn = MANEJADORES.get(trabajo.tipo)
+        if fn is None:
+            raise LookupError(f"Tipo de trabajo desconocido: {trabajo.tipo}")
+        fn(app, json.loads(trabajo.datos))
+    except Exception as e:
+        ahora = datetime.now()
+        agotado = trabajo.intentos >= app.config["TRABAJOS_MAX_INTENTOS"]
+        valores = {"error": f"{type(e).__name__}: {e}"[:1000]}
+        if agotado:
+            valores.update(estado=FALLIDO, terminado=ahora)
+        else:
+            valores.update(
+                estado=PENDIENTE,
+                disponible_en=ahora + timedelta(seconds=_espera(app, trabajo.intentos)),
+            )
+        resultado = FALLIDO if agotado else "reintento"
+        app.logger.warning("Trabajo %s (%s) falló: %s", trabajo.id, trabajo.tipo, e)
+    else:
+        ahora = datetime.now()
+        valores = {"estado": HECHO, "terminado": ahora, "error": None}
+        resultado = HECHO
+    db.session.execute(
+        update(Trabajo)
+        .where(Trabajo.id == trabajo.id, Trabajo.estado == EN_CURSO)
+        .values(**valores)
+    )
+    db.session.commit()
+    metricas.registro.observar_trabajo(
+        trabajo.tipo, resultado, (ahora - trabajo.creado).total_seconds()
+    )
+    return resultado
+
+
+def procesar(app, limite=20):
+    """Ejecuta un lote de trabajos disponibles; devuelve cuántos tomó."""
+    tomados = tomar(app, limite)
+    for trabajo in tomados:
+        ejecutar(app, trabajo)
+    if time.monotonic() - _poda["ultima"] > 60:
+        _poda["ultima"] = time.monotonic()
+        limite_fecha = datetime.now() - timedelta(
+            seconds=app.config["TRABAJOS_RETENCION_SEGUNDOS"]
+        )
+        db.session.execute(
+            delete(Trabajo).where(Trabajo.estado == HECHO, Trabajo.terminado < limite_fecha)
+        )
+        db.session.commit()
+    return len(tomados)
+
+
+def bucle(app, detener=None, una_vez=False):
+    """Bucle del proceso trabajador. Duerme solo cuando la cola queda vacía."""
+    detener = detener or threading.Event()
+    while not detener.is_set():
+        with app.app_context():
+            try:
+                tomados = procesar(app, app.config["TRABAJOS_LOTE"])
+            finally:
+                db.session.remove()
+        try:
+            metricas.volcar(app)
+        except OSError as e:
+            app.logger.warning("No se pudieron volcar las métricas: %s", e)
+        if una_vez and not tomados:
+            return
+        if not tomados:
+            detener.wait(app.config["TRABAJOS_INTERVALO_SEGUNDOS"])
+
+
+# ─────────────────────────────
+# Observabilidad
+# ─────────────────────────────
+def estado():
+    """Profundidad de la cola y latencia (creado → terminado) de la última hora."""
+    ahora = datetime.now()
+    por_estado = dict.fromkeys(ESTADOS, 0)
+    por_estado.update(db.session.execute(
+        select(Trabajo.estado, func.count()).group_by(Trabajo.estado)
+    ).all())
+    mas_antiguo = db.session.scalar(
+        select(func.min(Trabajo.creado)).where(Trabajo.estado == PENDIENTE)
+    )
+    recientes = db.session.execute(
+        select(Trabajo.creado, Trabajo.terminado)
+        .where(Trabajo.estado == HECHO, Trabajo.terminado >= ahora - timedelta(hours=1))
+        .order_by(Trabajo.terminado.desc())
+        .limit(1000)
+    ).all()
+    latencias = sorted((t - c).total_seconds() for c, t in recientes)
+
+    def percentil(p):
+        if not latencias:
+            return None
+        return round(latencias[min(len(latencias) - 1, int(p / 100 * len(latencias)))], 3)
+
+    return {
+        "por_estado": por_estado,
+        "pendiente_mas_antiguo_segundos": (
+            round((ahora - mas_antiguo).total_seconds(), 1) if mas_antiguo else None
+        ),
+        "ultima_hora": {
+            "hechos": len(latencias),
+            "latencia_p50_segundos": percentil(50),
+            "latencia_p95_segundos": percentil(95),
+        },
+    }
+
+
+def texto_prometheus(datos):
+    """Gauges de profundidad de la cola para agregar a /metrics."""
+    nombre = f"{metricas.PREFIJO}_trabajos"
+    lineas = [f"# HELP {nombre} Trabajos en la cola por estado.", f"# TYPE {nombre} gauge"]
+    for est, n in datos["por_estado"].items():
+        lineas.append(f'{nombre}{{estado="{est}"}} {n}')
+    nombre = f"{metricas.PREFIJO}_trabajos_pendiente_mas_antiguo_segundos"
+    lineas.append(f"# HELP {nombre} Antigüedad del trabajo pendiente más viejo.")
+    lineas.append(f"# TYPE {nombre} gauge")
+    lineas.append(f"{nombre} {datos['pendiente_mas_antiguo_segundos'] or 0}")
+    return "\n".join(lineas) + "\n"